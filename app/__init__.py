@@ -9,7 +9,9 @@ db = SQLAlchemy()
 def create_app():
     load_dotenv()
     app = Flask(__name__, template_folder="templates")
-    CORS(app)
+    # origens aceitas pelo CORS, separadas por vírgula ('*' = qualquer origem)
+    app.config['CORS_ORIGENS'] = [o.strip() for o in os.getenv('CORS_ORIGENS', '*').split(',') if o.strip()]
+    CORS(app, origins=app.config['CORS_ORIGENS'], expose_headers=['Retry-After', 'X-Proximo-Cursor'])
 
     database_url = os.getenv('DATABASE_URL')
     if not database_url:
@@ -18,13 +20,124 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # perfil de armazenamento: 'producao' (WAL/PRAGMAs no SQLite, pool dimensionado) ou 'padrao'
+    app.config['BANCO_PERFIL'] = os.getenv('BANCO_PERFIL', 'producao')
+    app.config['BANCO_POOL_TAMANHO'] = int(os.getenv('BANCO_POOL_TAMANHO', 8))
+    app.config['BANCO_POOL_EXTRA'] = int(os.getenv('BANCO_POOL_EXTRA', 8))
+    app.config['BANCO_POOL_TIMEOUT'] = float(os.getenv('BANCO_POOL_TIMEOUT', 10))
+    app.config['BANCO_POOL_RECICLAR'] = int(os.getenv('BANCO_POOL_RECICLAR', 1800))
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_MMAP_MB'] = int(os.getenv('SQLITE_MMAP_MB', 256))
+    app.config['SQLITE_CACHE_MB'] = int(os.getenv('SQLITE_CACHE_MB', 64))
+
+    # hash de senhas: método/custo do Werkzeug e tamanho do pool de processos
+    app.config['SENHA_METODO'] = os.getenv('SENHA_METODO', 'pbkdf2:sha256')
+    app.config['SENHA_WORKERS'] = int(os.getenv('SENHA_WORKERS', 2))
+    app.config['SENHA_FILA_MAXIMA'] = int(os.getenv('SENHA_FILA_MAXIMA', 32))
+
+    # cache de respostas das rotas de catálogo (espaços, instituições, horários)
+    app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memoria')
+    app.config['CACHE_URL'] = os.getenv('CACHE_URL')
+    app.config['CACHE_TTL'] = int(os.getenv('CACHE_TTL', 60))
+    app.config['CACHE_CAPACIDADE'] = int(os.getenv('CACHE_CAPACIDADE', 1024))
+
+    # instrumentação de pedidos/SQL em GET /metrics (METRICAS_ATIVAS=0 desliga por completo)
+    app.config['METRICAS_ATIVAS'] = os.getenv('METRICAS_ATIVAS', '1') == '1'
+    app.config['METRICAS_SQL_LENTA_MS'] = float(os.getenv('METRICAS_SQL_LENTA_MS', 100))
+    app.config['METRICAS_PEDIDO_LENTO_MS'] = float(os.getenv('METRICAS_PEDIDO_LENTO_MS', 1000))
+
+    # atualizações de horários via SSE: pub/sub em processo ou Redis entre processos
+    app.config['EVENTOS_BACKEND'] = os.getenv('EVENTOS_BACKEND', 'memoria')
+    app.config['EVENTOS_URL'] = os.getenv('EVENTOS_URL')
+    # fluxos SSE abertos ao mesmo tempo por processo (acima disso, 503 e o cliente consulta periodicamente;
+    # 0 = sem limite) e duração máxima de cada fluxo, em segundos, antes do navegador reconectar
+    app.config['EVENTOS_FLUXOS_MAXIMOS'] = int(os.getenv('EVENTOS_FLUXOS_MAXIMOS', 4))
+    app.config['EVENTOS_FLUXO_SEGUNDOS'] = float(os.getenv('EVENTOS_FLUXO_SEGUNDOS', 300))
+
+    # modo de execução de main.py: dev (servidor do Werkzeug), wsgi (gunicorn) ou asgi (uvicorn)
+    app.config['SERVIDOR'] = os.getenv('SERVIDOR', 'dev')
+    app.config['SERVIDOR_HOST'] = os.getenv('SERVIDOR_HOST', '127.0.0.1')
+    app.config['SERVIDOR_PORTA'] = int(os.getenv('SERVIDOR_PORTA', 5000))
+    app.config['SERVIDOR_WORKERS'] = int(os.getenv('SERVIDOR_WORKERS', 2))
+    app.config['SERVIDOR_THREADS'] = int(os.getenv('SERVIDOR_THREADS', 8))
+    # validade, em segundos, de um dia carregado nos índices por processo (ocupação e relatório de ocupação);
+    # 0 = sem expiração, só para um único processo
+    app.config['OCUPACAO_TTL'] = float(os.getenv('OCUPACAO_TTL', 5)) or None
+    app.config['ANALITICA_TTL'] = float(os.getenv('ANALITICA_TTL', 60)) or None
+
+    # controle de admissão: fichas por segundo e rajada dos baldes por IP e por instituição,
+    # e pedidos simultâneos por endpoint pesado em cada processo (0 = sem limite)
+    app.config['LIMITES_ATIVOS'] = os.getenv('LIMITES_ATIVOS', '1') == '1'
+    app.config['LIMITES_BACKEND'] = os.getenv('LIMITES_BACKEND', 'memoria')
+    app.config['LIMITES_URL'] = os.getenv('LIMITES_URL')
+    app.config['LIMITE_IP_TAXA'] = float(os.getenv('LIMITE_IP_TAXA', 20))
+    app.config['LIMITE_IP_RAJADA'] = float(os.getenv('LIMITE_IP_RAJADA', 60))
+    app.config['LIMITE_INST_TAXA'] = float(os.getenv('LIMITE_INST_TAXA', 100))
+    app.config['LIMITE_INST_RAJADA'] = float(os.getenv('LIMITE_INST_RAJADA', 300))
+    app.config['LIMITES_CONCORRENCIA'] = int(os.getenv('LIMITES_CONCORRENCIA', 4))
+    # proxies reversos confiáveis na frente do app (o IP do cliente vem do X-Forwarded-For)
+    app.config['LIMITES_PROXIES'] = int(os.getenv('LIMITES_PROXIES', 0))
+
+    # arquivamento: `flask arquivar` move reservas mais antigas que isso para reservas_arquivo
+    app.config['ARQUIVO_DIAS'] = int(os.getenv('ARQUIVO_DIAS', 30))
+
+    # subida: 'versao' só aplica o schema quando os modelos mudaram; 'criar' roda create_all sempre
+    app.config['SCHEMA_MODO'] = os.getenv('SCHEMA_MODO', 'versao')
+    # cache em disco dos templates Jinja compilados (diretório vazio = temporário do sistema)
+    app.config['TEMPLATES_CACHE'] = os.getenv('TEMPLATES_CACHE', '1') == '1'
+    app.config['TEMPLATES_CACHE_DIR'] = os.getenv('TEMPLATES_CACHE_DIR') or None
+
+    from app.schema import MODOS_SCHEMA
+    if app.config['SCHEMA_MODO'] not in MODOS_SCHEMA:
+        raise ValueError(f"SCHEMA_MODO deve ser um de {', '.join(MODOS_SCHEMA)}.")
+
+    from app.inicio import configurar_templates
+    configurar_templates(app)
+
+    from app.banco import PERFIS, opcoes_engine
+    if app.config['BANCO_PERFIL'] not in PERFIS:
+        raise ValueError(f"BANCO_PERFIL deve ser um de {', '.join(PERFIS)}.")
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(app.config)
+
     db.init_app(app)
 
+    from app.ocupacao import IndiceOcupacao
+    # índice de ocupação por (espaço, data) usado em horarios_disponiveis
+    app.extensions['ocupacao'] = IndiceOcupacao(ttl=app.config['OCUPACAO_TTL'])
+
+    from app.analitica import IndiceAnalitico
+    # agregados por (espaço, data) do relatório de ocupação do painel do admin
+    app.extensions['analitica'] = IndiceAnalitico(ttl=app.config['ANALITICA_TTL'])
+
+    from app.cache import criar_cache
+    app.extensions['cache'] = criar_cache(app)
+
+    from app.eventos import criar_hub
+    app.extensions['eventos'] = criar_hub(app)
+
+    from app.senhas import ServicoSenhas
+    app.extensions['senhas'] = ServicoSenhas(app.config['SENHA_METODO'], app.config['SENHA_WORKERS'], app.config['SENHA_FILA_MAXIMA'])
+
     from app import routes
     routes.init_routes(app)
 
+    from app.importacao import comando_importar
+    app.cli.add_command(comando_importar)
+
+    from app.arquivo import comando_arquivar
+    app.cli.add_command(comando_arquivar)
+
+    from app.inicio import comando_precompilar
+    app.cli.add_command(comando_precompilar)
+
     with app.app_context():
-        # cria tabelas automaticamente (SQLite local se não tiver DATABASE_URL)
-        db.create_all()
+        from app.banco import configurar_banco
+        configurar_banco(app)
+        from app.metricas import configurar_metricas
+        configurar_metricas(app)
+        from app.limites import configurar_limites
+        configurar_limites(app)
+        from app.schema import preparar_schema
+        preparar_schema(app.config['SCHEMA_MODO'])
 
     return app
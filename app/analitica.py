@@ -0,0 +1,140 @@
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import func, select, union_all
+
+from app import db
+from app.models import Reserva, ReservaArquivo
+from app.ocupacao import IndiceOcupacao, OcupacaoDia, _mascara
+
+PERIODO_MAXIMO_DIAS = 366
+TOP_USUARIOS = 5
+HORARIOS_PICO = 3
+
+
+class DiaAnalitico:
+    """Agregados de um espaço em uma data: ocupação em minutos, reservas por hora de início e por usuário."""
+    __slots__ = ('ocupacao', 'reservas', 'por_hora', 'por_usuario')
+
+    def __init__(self):
+        self.ocupacao = OcupacaoDia()
+        self.reservas = 0
+        self.por_hora = Counter()
+        self.por_usuario = Counter()
+
+    def adicionar(self, inicio, fim, user_id, quantidade=1):
+        self.ocupacao.adicionar(inicio, fim)
+        self.reservas += quantidade
+        self.por_hora[inicio // 60] += quantidade
+        self.por_usuario[user_id] += quantidade
+
+    def minutos(self, capacidade):
+        """Minutos reservados dentro da grade (bitmap `capacidade`); sobreposições contam uma vez."""
+        return (self.ocupacao.bitmap & capacidade).bit_count()
+
+
+class IndiceAnalitico(IndiceOcupacao):
+    """Cache por (espaço, data) dos DiaAnalitico usados pelo relatório de ocupação.
+
+    Mesmo LRU, marca de geração e TTL do índice de ocupação: os dias que
+    faltam num período são agregados no banco de uma vez, e criar_reserva
+    atualiza os dias já carregados com registrar().
+    """
+
+    def periodo(self, espaco_ids, datas, carregar):
+        """DiaAnalitico de cada (espaço, data); `carregar(ids, inicio, fim)` devolve linhas agrupadas do banco."""
+        agora = time.monotonic()
+        dias, faltando = {}, []
+        with self._lock:
+            for chave in ((espaco_id, data) for espaco_id in espaco_ids for data in datas):
+                item = self._dias.get(chave)
+                if item is not None:
+                    dia, expira = item
+                    if expira is None or expira >= agora:
+                        self._dias.move_to_end(chave)
+                        dias[chave] = dia
+                        continue
+                    del self._dias[chave]
+                faltando.append(chave)
+            geracao = self._geracao
+        if faltando:
+            novos = {chave: DiaAnalitico() for chave in faltando}
+            linhas = carregar(sorted({e for e, _ in faltando}), min(d for _, d in faltando), max(d for _, d in faltando))
+            for espaco_id, numero_dia, inicio, fim, user_id, quantidade in linhas:
+                dia = novos.get((espaco_id, date.fromordinal(numero_dia)))
+                if dia is not None:
+                    dia.adicionar(inicio, fim, user_id, quantidade)
+            self.guardar(novos, geracao)
+            dias.update(novos)
+        return dias
+
+    def registrar(self, espaco_id, data, intervalo, user_id=None):
+        """Soma uma reserva recém-gravada aos agregados do dia, se ele já estiver carregado"""
+        with self._lock:
+            self._geracao += 1
+            item = self._dias.get((espaco_id, data))
+            if item is not None:
+                item[0].adicionar(intervalo.inicio, intervalo.fim, user_id)
+
+
+def carregar_agregados(espaco_ids, data_inicio, data_fim):
+    """Reservas (atuais e arquivadas) agrupadas por espaço, data, intervalo e usuário, numa consulta."""
+    def parte(modelo):
+        return select(modelo.id_espaco, modelo.dia_reserva, modelo.minuto_inicio, modelo.minuto_fim, modelo.id_user).where(
+            modelo.id_espaco.in_(espaco_ids),
+            modelo.dia_reserva >= data_inicio.toordinal(), modelo.dia_reserva <= data_fim.toordinal()
+        )
+    fonte = union_all(parte(Reserva), parte(ReservaArquivo)).subquery()
+    colunas = (fonte.c.id_espaco, fonte.c.dia_reserva, fonte.c.minuto_inicio, fonte.c.minuto_fim, fonte.c.id_user)
+    return db.session.execute(select(*colunas, func.count()).group_by(*colunas)).all()
+
+
+def capacidade_grade(modelo):
+    """Bitmap dos minutos cobertos pelos slots da grade (slots que viram a meia-noite ficam de fora)."""
+    capacidade = 0
+    for slot in modelo.minutos:
+        if slot.inicio < slot.fim:
+            capacidade |= _mascara(slot.inicio, slot.fim)
+    return capacidade
+
+
+def _percentual(minutos, capacidade):
+    return round(100 * minutos / capacidade, 1) if capacidade else None
+
+
+def relatorio_espaco(espaco, datas, dias):
+    """Ocupação de um espaço no período: total, por dia, por semana ISO e horários de pico."""
+    capacidade = capacidade_grade(espaco.modelo_slots)
+    minutos_dia = capacidade.bit_count()
+    por_dia, semanas, horas = [], defaultdict(lambda: [0, 0, 0]), Counter()
+    for data in datas:
+        dia = dias[(espaco.id, data)]
+        minutos = dia.minutos(capacidade)
+        por_dia.append({'data': data.isoformat(), 'reservas': dia.reservas, 'minutos': minutos,
+                        'ocupacao_pct': _percentual(minutos, minutos_dia)})
+        ano, semana, _ = data.isocalendar()
+        acumulado = semanas[f'{ano}-W{semana:02d}']
+        acumulado[0] += dia.reservas
+        acumulado[1] += minutos
+        acumulado[2] += minutos_dia
+        horas.update(dia.por_hora)
+    total_minutos = sum(d['minutos'] for d in por_dia)
+    return {
+        'id': espaco.id,
+        'nome': espaco.nome,
+        'capacidade_minutos_dia': minutos_dia,
+        'reservas': sum(d['reservas'] for d in por_dia),
+        'minutos': total_minutos,
+        'ocupacao_pct': _percentual(total_minutos, minutos_dia * len(datas)),
+        'por_dia': por_dia,
+        'por_semana': [
+            {'semana': semana, 'reservas': reservas, 'minutos': minutos, 'ocupacao_pct': _percentual(minutos, capacidade_semana)}
+            for semana, (reservas, minutos, capacidade_semana) in semanas.items()
+        ],
+        'horarios_pico': [{'hora': f'{hora:02d}:00', 'reservas': n} for hora, n in horas.most_common(HORARIOS_PICO)],
+    }
+
+
+def datas_do_periodo(data_inicio, data_fim):
+    return [data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1)]
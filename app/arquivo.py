@@ -0,0 +1,63 @@
+import time as relogio
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.models import Reserva, ReservaArquivo
+
+TAMANHO_LOTE = 1000
+COLUNAS = ('id', 'id_espaco', 'id_user', 'data_reserva', 'hora_inicio', 'hora_fim', 'dia_reserva', 'minuto_inicio',
+           'minuto_fim', 'observacoes')
+
+
+def arquivar_reservas(antes_de, tamanho_lote=TAMANHO_LOTE):
+    """Move as reservas com data_reserva < antes_de de `reservas` para `reservas_arquivo`.
+
+    Cada lote é copiado (INSERT ... SELECT) e apagado na mesma transação, um
+    commit por lote, então o job pode ser interrompido e rodado de novo. A
+    reserva de maior id nunca é arquivada: num banco SQLite antigo, sem
+    AUTOINCREMENT, apagá-la faria o próximo INSERT reutilizar o id, que já
+    estaria no arquivo. Retorna um relatório com o total movido.
+    """
+    inicio = relogio.perf_counter()
+    movidas = 0
+    maior_id = db.session.scalar(select(func.max(Reserva.id)))
+    colunas = [getattr(Reserva, nome) for nome in COLUNAS]
+    while maior_id is not None:
+        ids = db.session.scalars(
+            select(Reserva.id).where(Reserva.dia_reserva < antes_de.toordinal(), Reserva.id < maior_id)
+            .order_by(Reserva.id).limit(tamanho_lote)
+        ).all()
+        if not ids:
+            break
+        db.session.execute(insert(ReservaArquivo).from_select(COLUNAS, select(*colunas).where(Reserva.id.in_(ids))))
+        db.session.execute(delete(Reserva).where(Reserva.id.in_(ids)))
+        db.session.commit()
+        movidas += len(ids)
+    return {'antes_de': antes_de.isoformat(), 'movidas': movidas, 'segundos': round(relogio.perf_counter() - inicio, 3)}
+
+
+# --- CLI ---
+@click.command('arquivar')
+@click.option('--dias', type=int, default=None,
+              help='Arquiva reservas de mais de N dias atrás (padrão: ARQUIVO_DIAS).')
+@click.option('--antes-de', 'antes_de', default=None, help='Arquiva reservas anteriores a esta data (YYYY-MM-DD).')
+@click.option('--lote', type=int, default=TAMANHO_LOTE)
+@with_appcontext
+def comando_arquivar(dias, antes_de, lote):
+    """Move reservas passadas para a tabela de arquivo (reservas_arquivo)."""
+    if antes_de:
+        try:
+            limite = datetime.strptime(antes_de, '%Y-%m-%d').date()
+        except ValueError:
+            raise click.BadParameter('use YYYY-MM-DD.', param_hint='--antes-de')
+    else:
+        limite = date.today() - timedelta(days=current_app.config['ARQUIVO_DIAS'] if dias is None else dias)
+    if limite > date.today():
+        raise click.BadParameter('só reservas passadas podem ser arquivadas.', param_hint='--antes-de')
+    relatorio = arquivar_reservas(limite, lote)
+    click.echo(f"{relatorio['movidas']} reservas anteriores a {relatorio['antes_de']} arquivadas em {relatorio['segundos']}s")
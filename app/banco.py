@@ -0,0 +1,84 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from app import db
+
+PERFIS = ('producao', 'padrao')
+
+
+def _sqlite_em_arquivo(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def opcoes_engine(config):
+    """SQLALCHEMY_ENGINE_OPTIONS do perfil BANCO_PERFIL.
+
+    'padrao' mantém os valores do SQLAlchemy. 'producao' dimensiona o pool
+    para as threads do servidor (SQLite em arquivo e PostgreSQL) e, fora do
+    SQLite, testa conexões antes do uso e as recicla periodicamente.
+    """
+    url = config['SQLALCHEMY_DATABASE_URI']
+    if config['BANCO_PERFIL'] == 'padrao' or make_url(url).get_backend_name() == 'sqlite' and not _sqlite_em_arquivo(url):
+        return {}
+    opcoes = {
+        'pool_size': config['BANCO_POOL_TAMANHO'],
+        'max_overflow': config['BANCO_POOL_EXTRA'],
+        'pool_timeout': config['BANCO_POOL_TIMEOUT'],
+    }
+    if make_url(url).get_backend_name() != 'sqlite':
+        opcoes['pool_pre_ping'] = True
+        opcoes['pool_recycle'] = config['BANCO_POOL_RECICLAR']
+    return opcoes
+
+
+def configurar_banco(app):
+    """Aplica os PRAGMAs do perfil 'producao' a cada conexão nova do SQLite em arquivo.
+
+    WAL deixa leituras correrem junto com a escrita de uma reserva (só
+    escritores se serializam), synchronous=NORMAL é seguro em WAL e evita um
+    fsync por commit, busy_timeout faz escritores concorrentes esperarem em vez
+    de falharem com "database is locked", e mmap_size/cache_size mantêm as
+    páginas quentes em memória. Chamar dentro do app_context, antes da
+    primeira conexão.
+    """
+    if app.config['BANCO_PERFIL'] != 'producao' or not _sqlite_em_arquivo(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    pragmas = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}",
+        f"PRAGMA mmap_size={app.config['SQLITE_MMAP_MB'] * 1024 * 1024}",
+        # valor negativo: tamanho em KiB em vez de número de páginas
+        f"PRAGMA cache_size={-app.config['SQLITE_CACHE_MB'] * 1024}",
+    )
+
+    @event.listens_for(db.engine, 'connect')
+    def _aplicar_pragmas(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def travar_espaco(espaco_id):
+    """Abre a transação de uma reserva e bloqueia reservas concorrentes no espaço.
+
+    No SQLite a transação começa com BEGIN IMMEDIATE, que já toma o lock de
+    escrita do banco; nos demais bancos (PostgreSQL via DATABASE_URL) a linha do
+    espaço é bloqueada com SELECT ... FOR UPDATE. Em ambos os casos a checagem
+    de conflito e o INSERT feitos em seguida ficam serializados até o commit.
+
+    Precisa vir antes de qualquer escrita da sessão no pedido. Retorna o Espaco ou None.
+    """
+    from app.models import Espaco
+    sessao = db.session
+    if sessao.get_bind().dialect.name == 'sqlite':
+        # O driver sqlite3 só abre transação antes de INSERT/UPDATE/DELETE; abrindo
+        # aqui explicitamente ele reaproveita esta transação, e o commit/rollback
+        # da sessão a encerram normalmente.
+        sessao.connection().exec_driver_sql('BEGIN IMMEDIATE')
+        return sessao.get(Espaco, espaco_id)
+    return sessao.query(Espaco).filter_by(id=espaco_id).with_for_update().first()
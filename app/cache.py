@@ -0,0 +1,154 @@
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from flask import Response, current_app, request
+
+from app.compartilhado import cliente_compartilhado
+
+
+class CacheMemoria:
+    """Backend em processo: LRU com TTL por entrada."""
+
+    def __init__(self, capacidade=1024):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        # contadores (incr) ficam fora do LRU: perder uma versão por despejo
+        # faria entradas antigas voltarem a valer
+        self._contadores = {}
+        self._lock = Lock()
+
+    def get(self, chave):
+        with self._lock:
+            if chave in self._contadores:
+                return self._contadores[chave]
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira = item
+            if expira is not None and expira < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + ttl if ttl else None)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def delete(self, *chaves):
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+
+    def incr(self, chave):
+        with self._lock:
+            valor = self._contadores[chave] = self._contadores.get(chave, 0) + 1
+            return valor
+
+
+class CacheCompartilhado:
+    """Backend compartilhado entre processos (cliente de cliente_compartilhado): get/set(ex=)/delete/incr."""
+
+    def __init__(self, cliente, prefixo='valida:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def get(self, chave):
+        valor = self.cliente.get(self.prefixo + chave)
+        return json.loads(valor) if valor is not None else None
+
+    def set(self, chave, valor, ttl=None):
+        self.cliente.set(self.prefixo + chave, json.dumps(valor), ex=ttl)
+
+    def delete(self, *chaves):
+        if chaves:
+            self.cliente.delete(*(self.prefixo + chave for chave in chaves))
+
+    def incr(self, chave):
+        return self.cliente.incr(self.prefixo + chave)
+
+
+class CacheRespostas:
+    """Cache de respostas GET das rotas de catálogo, com ETag.
+
+    As chaves são montadas pelas rotas (por instituição, espaço e data) e
+    apagadas pelas rotas que gravam. Os horários de um espaço usam uma versão
+    no próprio cache, incrementada quando a grade do espaço muda, para
+    invalidar todas as datas de uma vez.
+    """
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+
+    def responder(self, chave, gerar, ttl=None):
+        """Serve a resposta guardada em `chave` ou chama gerar(); só respostas 200 são guardadas.
+
+        `ttl` encurta a validade desta entrada (segundos, nunca acima de CACHE_TTL).
+        If-None-Match igual ao ETag devolve 304 sem tocar no banco.
+        """
+        entrada = self.backend.get(chave)
+        if entrada is None:
+            marca = self.backend.get('invalidacoes')
+            resposta = current_app.make_response(gerar())
+            if resposta.status_code != 200:
+                return resposta
+            corpo = resposta.get_data(as_text=True)
+            entrada = (corpo, hashlib.sha1(corpo.encode()).hexdigest(), resposta.mimetype)
+            # se alguma escrita invalidou o cache enquanto a resposta era gerada,
+            # ela pode estar defasada: serve, mas não guarda
+            if self.backend.get('invalidacoes') == marca:
+                self.backend.set(chave, entrada, min(self.ttl, max(1, math.ceil(ttl))) if ttl else self.ttl)
+        corpo, etag, mimetype = entrada
+        resposta = Response(corpo, mimetype=mimetype)
+        resposta.set_etag(etag)
+        return resposta.make_conditional(request)
+
+    # --- chaves ---
+    @staticmethod
+    def chave_espacos(inst_id):
+        return f'espacos:{inst_id or "todos"}'
+
+    @staticmethod
+    def chave_instituicoes(cnpj=None):
+        return f'instituicoes:{cnpj or "todas"}'
+
+    def chave_horarios(self, espaco_id, data):
+        versao = self.backend.get(f'versao:horarios:{espaco_id}') or 0
+        return f'horarios:{espaco_id}:{versao}:{data}'
+
+    # --- invalidação ---
+    def invalidar_espacos(self, inst_id):
+        self.backend.incr('invalidacoes')
+        self.backend.delete(self.chave_espacos(inst_id), self.chave_espacos(None))
+
+    def invalidar_instituicoes(self, cnpj):
+        self.backend.incr('invalidacoes')
+        self.backend.delete(self.chave_instituicoes(cnpj), self.chave_instituicoes(None))
+
+    def invalidar_horarios(self, espaco_id, data=None):
+        """Apaga os horários de uma data, ou de todas as datas do espaço se data for None."""
+        self.backend.incr('invalidacoes')
+        if data is None:
+            self.backend.incr(f'versao:horarios:{espaco_id}')
+        else:
+            self.backend.delete(self.chave_horarios(espaco_id, data))
+
+
+def criar_cache(app):
+    """Monta o CacheRespostas conforme CACHE_BACKEND ('memoria', 'redis' ou 'desligado')."""
+    tipo = app.config['CACHE_BACKEND']
+    if tipo == 'redis':
+        backend = CacheCompartilhado(cliente_compartilhado(app.config['CACHE_URL']))
+    elif tipo == 'desligado':
+        backend = CacheMemoria(capacidade=0)
+    else:
+        backend = CacheMemoria(app.config['CACHE_CAPACIDADE'])
+    return CacheRespostas(backend, app.config['CACHE_TTL'])
@@ -0,0 +1,9 @@
+def cliente_compartilhado(url):
+    """Cliente Redis dos backends compartilhados entre processos (cache, eventos SSE e limites).
+
+    Cada backend usa só alguns métodos do cliente, listados na própria classe;
+    qualquer objeto com esses métodos serve no lugar do redis.Redis (um dublê
+    local em testes).
+    """
+    import redis  # dependência opcional, só para os backends compartilhados (requirements-producao.txt)
+    return redis.Redis.from_url(url)
@@ -0,0 +1,42 @@
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import IdentidadeConta
+
+
+class ContaDuplicada(Exception):
+    """Email ou CPF já usado por outra conta (a mensagem diz qual)."""
+
+
+def conflito_cadastro(email, cpf):
+    """Retorna a mensagem de duplicidade de email/CPF entre users e admins, ou None.
+
+    Uma única consulta na tabela identidades, em vez de quatro (email e CPF
+    em users e em admins).
+    """
+    existentes = db.session.query(IdentidadeConta.email).filter(
+        or_(IdentidadeConta.email == email, IdentidadeConta.cpf == cpf)
+    ).all()
+    if any(existente == email for existente, in existentes):
+        return 'E-mail já cadastrado.'
+    if existentes:
+        return 'CPF já cadastrado.'
+    return None
+
+
+def salvar_conta(conta, tipo):
+    """Grava a conta e a sua identidade na mesma transação.
+
+    Os índices únicos de identidades (e de users/admins) são a fonte da verdade:
+    se outro cadastro com o mesmo email ou CPF entrar entre a checagem e o
+    commit, levanta ContaDuplicada.
+    """
+    email, cpf = conta.email, conta.cpf
+    db.session.add(conta)
+    try:
+        db.session.flush()
+        db.session.add(IdentidadeConta(tipo=tipo, conta_id=conta.id, email=email, cpf=cpf))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise ContaDuplicada(conflito_cadastro(email, cpf) or 'Conta já cadastrada.')
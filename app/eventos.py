@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from queue import Queue, Full, Empty
+from threading import BoundedSemaphore, Lock, Thread
+
+from app.compartilhado import cliente_compartilhado
+
+logger = logging.getLogger(__name__)
+
+
+def canal_horarios(inst_id, espaco_id, data):
+    """Canal dos slots ocupados de um espaço em uma data (data em YYYY-MM-DD)."""
+    return f'horarios:{inst_id}:{espaco_id}:{data}'
+
+
+def canal_espaco(inst_id, espaco_id):
+    """Canal das mudanças do próprio espaço (grade de horários, remoção), para todas as datas."""
+    return f'espaco:{inst_id}:{espaco_id}'
+
+
+class HubEventos:
+    """Pub/sub em processo para os fluxos SSE.
+
+    Cada assinante recebe uma fila própria. Sem backend, publicar() entrega
+    direto aos assinantes locais; com um backend compartilhado a mensagem passa
+    por ele e volta para todos os processos (inclusive este) via entregar().
+    A thread que ouve o backend sobe no primeiro assinar() de cada processo:
+    threads não sobrevivem ao fork, e o app é criado no mestre do gunicorn.
+
+    Cada fluxo SSE aberto prende uma thread do servidor; `fluxos_maximos`
+    limita quantos ficam abertos ao mesmo tempo no processo (None = sem limite).
+    """
+
+    def __init__(self, backend=None, tamanho_fila=100, fluxos_maximos=None):
+        self.backend = backend
+        self.tamanho_fila = tamanho_fila
+        self._vagas_fluxo = BoundedSemaphore(fluxos_maximos) if fluxos_maximos else None
+        self._assinantes = defaultdict(set)
+        self._lock = Lock()
+        self._pid_ouvinte = None
+
+    def assinar(self, *canais):
+        """Cria uma fila que recebe os eventos de todos os `canais`."""
+        fila = Queue(maxsize=self.tamanho_fila)
+        with self._lock:
+            if self.backend is not None and self._pid_ouvinte != os.getpid():
+                self.backend.iniciar(self.entregar)
+                self._pid_ouvinte = os.getpid()
+            for canal in canais:
+                self._assinantes[canal].add(fila)
+        return fila
+
+    def abrir_fluxo(self):
+        """Ocupa uma vaga de fluxo SSE; False se o processo já está no limite."""
+        return self._vagas_fluxo is None or self._vagas_fluxo.acquire(blocking=False)
+
+    def fechar_fluxo(self, fila, *canais):
+        """Cancela a assinatura do fluxo e devolve a vaga; chamar no fechamento da resposta."""
+        self.cancelar(fila, *canais)
+        if self._vagas_fluxo is not None:
+            self._vagas_fluxo.release()
+
+    def cancelar(self, fila, *canais):
+        with self._lock:
+            for canal in canais:
+                filas = self._assinantes.get(canal)
+                if filas is not None:
+                    filas.discard(fila)
+                    if not filas:
+                        del self._assinantes[canal]
+
+    def publicar(self, canal, evento):
+        if self.backend is not None:
+            self.backend.publicar(canal, evento)
+        else:
+            self.entregar(canal, evento)
+
+    def entregar(self, canal, evento):
+        with self._lock:
+            filas = list(self._assinantes.get(canal, ()))
+        for fila in filas:
+            try:
+                fila.put_nowait(evento)
+            except Full:
+                # cliente lento: descarta o acumulado e pede para recarregar a lista inteira
+                with fila.mutex:
+                    fila.queue.clear()
+                fila.put_nowait({'tipo': 'recarregar'})
+
+
+class BackendEventosRedis:
+    """Backend compartilhado entre processos (cliente de cliente_compartilhado): publish e pubsub().psubscribe/listen."""
+
+    def __init__(self, cliente, prefixo='valida:eventos:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def iniciar(self, entregar):
+        def ouvir():
+            pubsub = self.cliente.pubsub()
+            pubsub.psubscribe(self.prefixo + '*')
+            for mensagem in pubsub.listen():
+                if mensagem.get('type') != 'pmessage':
+                    continue
+                canal = mensagem['channel']
+                canal = canal.decode() if isinstance(canal, bytes) else canal
+                try:
+                    entregar(canal[len(self.prefixo):], json.loads(mensagem['data']))
+                except Exception:
+                    logger.exception('Falha ao entregar evento de %s', canal)
+        Thread(target=ouvir, name='eventos-redis', daemon=True).start()
+
+    def publicar(self, canal, evento):
+        self.cliente.publish(self.prefixo + canal, json.dumps(evento))
+
+
+def criar_hub(app):
+    """Monta o HubEventos conforme EVENTOS_BACKEND ('memoria' ou 'redis')."""
+    backend = None
+    if app.config['EVENTOS_BACKEND'] == 'redis':
+        backend = BackendEventosRedis(cliente_compartilhado(app.config['EVENTOS_URL']))
+    return HubEventos(backend, fluxos_maximos=app.config['EVENTOS_FLUXOS_MAXIMOS'])
+
+
+def fluxo_sse(hub, fila, canais, intervalo_ping=15, duracao_maxima=None):
+    """Gera o corpo text/event-stream de um assinante até o cliente desconectar.
+
+    Depois de `duracao_maxima` segundos o fluxo termina e o navegador reconecta
+    sozinho (retry), devolvendo a thread ao servidor nesse meio-tempo.
+    """
+    fim = time.monotonic() + duracao_maxima if duracao_maxima else None
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            espera = intervalo_ping
+            if fim is not None:
+                espera = min(espera, fim - time.monotonic())
+                if espera <= 0:
+                    return
+            try:
+                evento = fila.get(timeout=espera)
+            except Empty:
+                # comentário SSE: mantém a conexão viva através de proxies
+                yield ': ping\n\n'
+                continue
+            yield f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+    finally:
+        hub.cancelar(fila, *canais)
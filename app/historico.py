@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+
+from sqlalchemy import union_all
+
+from app import db
+from app.models import Reserva, ReservaArquivo, Espaco, User
+from app.ocupacao import ROTULOS_MINUTO, formatar_dia
+
+
+def _consulta_tabela(modelo, inst_id, data_inicio, data_fim, apos_id):
+    query = db.session.query(
+        modelo.id, modelo.dia_reserva, modelo.minuto_inicio, modelo.minuto_fim, modelo.observacoes,
+        Espaco.nome, User.nome, User.email, User.cpf
+    ).join(Espaco, modelo.id_espaco == Espaco.id).join(User, modelo.id_user == User.id)
+    if inst_id:
+        query = query.filter(Espaco.id_inst == inst_id)
+    if data_inicio:
+        query = query.filter(modelo.dia_reserva >= data_inicio.toordinal())
+    if data_fim:
+        query = query.filter(modelo.dia_reserva <= data_fim.toordinal())
+    if apos_id:
+        query = query.filter(modelo.id > apos_id)
+    return query
+
+
+def consulta_historico(inst_id=None, data_inicio=None, data_fim=None, apos_id=None, limite=None):
+    """Consulta do histórico de reservas em uma única query com JOIN.
+
+    Projeta só as colunas usadas por historico_to_dict, então cada linha é uma
+    tupla simples (sem instâncias do ORM e sem lazy loads de espaco/user), com
+    a data e as horas nas colunas inteiras (dia_reserva, minuto_inicio/fim).
+    Lê `reservas` e `reservas_arquivo` com UNION ALL (o arquivamento preserva
+    os ids) e ordena por id, o que permite paginar por keyset (apos_id). Com
+    `limite`, cada tabela já devolve só os seus `limite` primeiros ids, e a
+    página não ordena o histórico inteiro.
+    """
+    atuais = _consulta_tabela(Reserva, inst_id, data_inicio, data_fim, apos_id)
+    arquivadas = _consulta_tabela(ReservaArquivo, inst_id, data_inicio, data_fim, apos_id)
+    if limite:
+        atuais = atuais.order_by(Reserva.id).limit(limite).subquery().select()
+        arquivadas = arquivadas.order_by(ReservaArquivo.id).limit(limite).subquery().select()
+        return db.session.query(union_all(atuais, arquivadas).subquery()).order_by('id').limit(limite)
+    return atuais.union_all(arquivadas).order_by(Reserva.id)
+
+
+def historico_to_dict(linha):
+    """Serializa uma linha de consulta_historico no formato de Reserva.to_dict_history."""
+    id_reserva, dia_reserva, minuto_inicio, minuto_fim, observacoes, espaco_nome, user_nome, user_email, user_cpf = linha
+    return {
+        'id': id_reserva,
+        'data_reserva': formatar_dia(dia_reserva),
+        'hora_inicio': ROTULOS_MINUTO[minuto_inicio],
+        'hora_fim': ROTULOS_MINUTO[minuto_fim],
+        'observacoes': observacoes,
+        'espaco_nome': espaco_nome,
+        'user_nome': user_nome,
+        'user_email': user_email,
+        'user_cpf': user_cpf
+    }
+
+
+CAMPOS_HISTORICO = ['id', 'data_reserva', 'hora_inicio', 'hora_fim', 'observacoes', 'espaco_nome', 'user_nome', 'user_email', 'user_cpf']
+
+
+def exportar_ndjson(linhas):
+    """Gera o histórico como NDJSON, um objeto por linha."""
+    for linha in linhas:
+        yield json.dumps(historico_to_dict(linha), ensure_ascii=False) + '\n'
+
+
+def exportar_csv(linhas):
+    """Gera o histórico como CSV; o cabeçalho sai antes da primeira linha do banco."""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=CAMPOS_HISTORICO)
+    escritor.writeheader()
+    yield _esvaziar(buffer)
+    for linha in linhas:
+        escritor.writerow(historico_to_dict(linha))
+        yield _esvaziar(buffer)
+
+
+def _esvaziar(buffer):
+    conteudo = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return conteudo
@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+import time as relogio
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import User, Espaco, IdentidadeConta, Instituicao, user_instituicoes, HORA_ABERTURA, HORA_FECHAMENTO, validar_grade
+
+TAMANHO_LOTE = 500
+VERDADEIROS = {'1', 'true', 'sim', 's', 'yes'}
+
+
+def ler_lote(conteudo, formato):
+    """Converte o corpo de uma importação (CSV com cabeçalho ou lista JSON) em lista de dicts."""
+    if formato == 'csv':
+        return list(csv.DictReader(io.StringIO(conteudo)))
+    dados = json.loads(conteudo)
+    if isinstance(dados, dict):
+        dados = dados.get('linhas', [])
+    if not isinstance(dados, list) or not all(isinstance(linha, dict) for linha in dados):
+        raise ValueError('O lote deve ser uma lista de objetos.')
+    return dados
+
+
+def _relatorio(total, inseridos, erros, inicio):
+    segundos = relogio.perf_counter() - inicio
+    return {
+        'total': total,
+        'inseridos': inseridos,
+        'erros': erros,
+        'segundos': round(segundos, 3),
+        'linhas_por_segundo': round(inseridos / segundos, 1) if segundos else None
+    }
+
+
+def _lotes(itens, tamanho):
+    for i in range(0, len(itens), tamanho):
+        yield itens[i:i + tamanho]
+
+
+# --- Usuários ---
+def importar_usuarios(linhas, inst_id, senhas, tamanho_lote=TAMANHO_LOTE):
+    """Cadastra usuários em lote e os vincula à instituição.
+
+    Valida tudo em memória, confere email/CPF contra identidades com uma
+    consulta por lote, gera os hashes em paralelo no pool de senhas e grava
+    users, identidades e user_instituicoes com INSERTs em lote, um commit por
+    lote. Linhas com erro são reportadas (linha começa em 1) e não impedem as demais.
+    """
+    inicio = relogio.perf_counter()
+    erros = []
+    validas = []
+    emails, cpfs = set(), set()
+    for numero, linha in enumerate(linhas, start=1):
+        dados = {k: str(linha.get(k) or '').strip() for k in ('cpf', 'nome', 'email', 'senha')}
+        faltando = [k for k, v in dados.items() if not v]
+        if faltando:
+            erros.append({'linha': numero, 'erro': f"Faltando {', '.join(faltando)}."})
+        elif dados['email'] in emails:
+            erros.append({'linha': numero, 'erro': 'E-mail repetido no lote.'})
+        elif dados['cpf'] in cpfs:
+            erros.append({'linha': numero, 'erro': 'CPF repetido no lote.'})
+        else:
+            emails.add(dados['email'])
+            cpfs.add(dados['cpf'])
+            validas.append((numero, dados))
+
+    inseridos = 0
+    for lote in _lotes(validas, tamanho_lote):
+        lote = _remover_existentes(lote, erros)
+        if not lote:
+            continue
+        hashes = senhas.gerar_hashes([dados['senha'] for _, dados in lote])
+        for (_, dados), senha_hash in zip(lote, hashes):
+            dados['senha'] = senha_hash
+        try:
+            _gravar_usuarios([dados for _, dados in lote], inst_id)
+            db.session.commit()
+            inseridos += len(lote)
+        except IntegrityError:
+            # outro cadastro entrou no meio: grava linha a linha para isolar o conflito
+            db.session.rollback()
+            for numero, dados in lote:
+                try:
+                    _gravar_usuarios([dados], inst_id)
+                    db.session.commit()
+                    inseridos += 1
+                except IntegrityError:
+                    db.session.rollback()
+                    erros.append({'linha': numero, 'erro': 'E-mail ou CPF já cadastrado.'})
+
+    erros.sort(key=lambda erro: erro['linha'])
+    return _relatorio(len(linhas), inseridos, erros, inicio)
+
+
+def _remover_existentes(lote, erros):
+    emails = [dados['email'] for _, dados in lote]
+    cpfs = [dados['cpf'] for _, dados in lote]
+    existentes = db.session.query(IdentidadeConta.email, IdentidadeConta.cpf).filter(
+        or_(IdentidadeConta.email.in_(emails), IdentidadeConta.cpf.in_(cpfs))
+    ).all()
+    emails_usados = {email for email, _ in existentes}
+    cpfs_usados = {cpf for _, cpf in existentes}
+    restantes = []
+    for numero, dados in lote:
+        if dados['email'] in emails_usados:
+            erros.append({'linha': numero, 'erro': 'E-mail já cadastrado.'})
+        elif dados['cpf'] in cpfs_usados:
+            erros.append({'linha': numero, 'erro': 'CPF já cadastrado.'})
+        else:
+            restantes.append((numero, dados))
+    return restantes
+
+
+def _gravar_usuarios(lote, inst_id):
+    ids = db.session.scalars(
+        insert(User).returning(User.id, sort_by_parameter_order=True),
+        [dict(dados, active_inst_id=inst_id) for dados in lote]
+    ).all()
+    db.session.execute(insert(IdentidadeConta), [
+        {'tipo': 'user', 'conta_id': user_id, 'email': dados['email'], 'cpf': dados['cpf']}
+        for user_id, dados in zip(ids, lote)
+    ])
+    db.session.execute(user_instituicoes.insert(), [
+        {'user_id': user_id, 'instituicao_id': inst_id} for user_id in ids
+    ])
+
+
+# --- Espaços ---
+def _ler_espaco(linha, inst_id):
+    def hora(campo, padrao):
+        valor = str(linha.get(campo) or '').strip()
+        return datetime.strptime(valor, '%H:%M').time() if valor else padrao
+
+    def booleano(campo, padrao):
+        valor = linha.get(campo)
+        if valor is None or valor == '':
+            return padrao
+        return valor if isinstance(valor, bool) else str(valor).strip().lower() in VERDADEIROS
+
+    def inteiro(campo, padrao):
+        try:
+            return int(linha.get(campo) or padrao)
+        except (TypeError, ValueError):
+            raise ValueError(f'{campo} deve ser um número inteiro.') from None
+
+    nome = str(linha.get('nome') or '').strip()
+    tipo = str(linha.get('tipo') or '').strip()
+    if not nome or not tipo:
+        raise ValueError("Faltando 'nome' ou 'tipo'.")
+    espaco = {
+        'id_inst': inst_id,
+        'nome': nome,
+        'tipo': tipo,
+        'descricao': str(linha.get('descricao') or ''),
+        'multi_reservas': booleano('multi_reservas', False),
+        'disponibilidade': booleano('disponibilidade', True),
+        'duracao_padrao': inteiro('duracao_padrao', 30),
+        'antecedencia_maxima_dias': inteiro('antecedencia_maxima_dias', 7),
+        'hora_abertura': hora('hora_abertura', HORA_ABERTURA),
+        'hora_fechamento': hora('hora_fechamento', HORA_FECHAMENTO)
+    }
+    if espaco['antecedencia_maxima_dias'] < 0:
+        raise ValueError('antecedencia_maxima_dias não pode ser negativa.')
+    validar_grade(espaco['duracao_padrao'], espaco['hora_abertura'], espaco['hora_fechamento'])
+    return espaco
+
+
+def importar_espacos(linhas, inst_id, tamanho_lote=TAMANHO_LOTE):
+    """Cadastra espaços em lote na instituição, um INSERT e um commit por lote."""
+    inicio = relogio.perf_counter()
+    erros = []
+    validos = []
+    for numero, linha in enumerate(linhas, start=1):
+        try:
+            validos.append(_ler_espaco(linha, inst_id))
+        except (TypeError, ValueError) as e:
+            erros.append({'linha': numero, 'erro': str(e)})
+
+    inseridos = 0
+    for lote in _lotes(validos, tamanho_lote):
+        db.session.execute(insert(Espaco), lote)
+        db.session.commit()
+        inseridos += len(lote)
+    return _relatorio(len(linhas), inseridos, erros, inicio)
+
+
+# --- CLI ---
+@click.group('importar')
+def comando_importar():
+    """Importa usuários ou espaços de um arquivo CSV/JSON para uma instituição."""
+
+
+def _executar_cli(arquivo, inst_id, importar):
+    if not db.session.get(Instituicao, inst_id):
+        raise click.ClickException(f'Instituição {inst_id} não encontrada.')
+    formato = 'csv' if arquivo.name.lower().endswith('.csv') else 'json'
+    relatorio = importar(ler_lote(arquivo.read(), formato))
+    for erro in relatorio['erros']:
+        click.echo(f"linha {erro['linha']}: {erro['erro']}", err=True)
+    click.echo(f"{relatorio['inseridos']}/{relatorio['total']} linhas importadas em "
+               f"{relatorio['segundos']}s ({relatorio['linhas_por_segundo']} linhas/s)")
+
+
+@comando_importar.command('usuarios')
+@click.argument('arquivo', type=click.File(encoding='utf-8'))
+@click.option('--inst-id', type=int, required=True)
+@with_appcontext
+def importar_usuarios_cli(arquivo, inst_id):
+    _executar_cli(arquivo, inst_id, lambda linhas: importar_usuarios(linhas, inst_id, current_app.extensions['senhas']))
+
+
+@comando_importar.command('espacos')
+@click.argument('arquivo', type=click.File(encoding='utf-8'))
+@click.option('--inst-id', type=int, required=True)
+@with_appcontext
+def importar_espacos_cli(arquivo, inst_id):
+    _executar_cli(arquivo, inst_id, lambda linhas: importar_espacos(linhas, inst_id))
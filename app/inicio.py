@@ -0,0 +1,46 @@
+import os
+import time as relogio
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+
+def configurar_templates(app):
+    """Liga o cache de bytecode do Jinja (TEMPLATES_CACHE) antes do primeiro template.
+
+    O template compilado fica em disco, com o checksum do fonte: o primeiro
+    acesso de cada processo lê o bytecode em vez de recompilar o HTML, e uma
+    edição do template invalida a entrada sozinha. Precisa rodar antes de
+    qualquer acesso a app.jinja_env.
+    """
+    if not app.config['TEMPLATES_CACHE']:
+        return
+    diretorio = app.config['TEMPLATES_CACHE_DIR']
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(diretorio)}
+
+
+def precompilar_templates(app):
+    """Carrega todos os templates .html no ambiente Jinja do app; retorna os nomes.
+
+    Antes do fork (gunicorn), os workers herdam os templates já compilados em
+    memória; em processos independentes (uvicorn), o cache de bytecode fica
+    preenchido para os demais.
+    """
+    nomes = [nome for nome in app.jinja_env.list_templates() if nome.endswith('.html')]
+    for nome in nomes:
+        app.jinja_env.get_template(nome)
+    return nomes
+
+
+# --- CLI ---
+@click.command('precompilar')
+@with_appcontext
+def comando_precompilar():
+    """Compila os templates no cache de bytecode (rodar no deploy, antes de subir os workers)."""
+    inicio = relogio.perf_counter()
+    nomes = precompilar_templates(current_app)
+    click.echo(f'{len(nomes)} templates compilados em {relogio.perf_counter() - inicio:.3f}s')
@@ -0,0 +1,239 @@
+import math
+import time
+from collections import OrderedDict, defaultdict
+from threading import BoundedSemaphore, Lock
+
+from flask import g, jsonify, request
+
+from app import db
+from app.compartilhado import cliente_compartilhado
+from app.models import Espaco
+
+# endpoint -> custo em fichas; os demais custam 1. Hash de senha, escritas que
+# travam o espaço e serialização de muitas linhas pesam mais.
+CUSTOS = {
+    'login': 10,
+    'register_user': 10,
+    'register_admin': 10,
+    'importar_lote': 30,
+    'criar_reserva': 3,
+    'criar_reservas_lote': 10,
+    'listar_reservas': 5,
+    'exportar_reservas': 20,
+    'relatorio_ocupacao': 5,
+}
+# endpoints com no máximo LIMITES_CONCORRENCIA pedidos em andamento por processo
+CONCORRENTES = ('importar_lote', 'criar_reservas_lote', 'listar_reservas', 'exportar_reservas', 'relatorio_ocupacao')
+# fora do controle de admissão
+ISENTOS = ('static', 'metrics')
+
+
+class LimitesMemoria:
+    """Backend em processo: um balde de fichas por chave, com os baldes mais antigos despejados (LRU)."""
+
+    def __init__(self, capacidade=10000):
+        self.capacidade = capacidade
+        self._baldes = OrderedDict()  # chave -> (fichas, instante)
+        self._lock = Lock()
+
+    def consumir(self, chave, custo, taxa, rajada):
+        """Tira `custo` fichas do balde; retorna 0 se admitiu, ou os segundos até haver fichas."""
+        agora = time.monotonic()
+        custo = min(custo, rajada)
+        with self._lock:
+            fichas, instante = self._baldes.pop(chave, (rajada, agora))
+            fichas = min(rajada, fichas + (agora - instante) * taxa)
+            espera = 0 if fichas >= custo else (custo - fichas) / taxa
+            self._baldes[chave] = (fichas - custo if not espera else fichas, agora)
+            if len(self._baldes) > self.capacidade:
+                self._baldes.popitem(last=False)
+        return espera
+
+
+class LimitesCompartilhados:
+    """Backend compartilhado entre processos (cliente de cliente_compartilhado): incrby/expire.
+
+    Cada chave vira uma janela fixa de rajada/taxa segundos que aceita até
+    `rajada` fichas: a mesma taxa média e a mesma rajada do balde, com um
+    contador atômico por janela.
+    """
+
+    def __init__(self, cliente, prefixo='valida:limite:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def consumir(self, chave, custo, taxa, rajada):
+        janela = rajada / taxa
+        agora = time.time()
+        inicio = agora - agora % janela
+        chave = f'{self.prefixo}{chave}:{int(agora // janela)}'
+        usado = self.cliente.incrby(chave, min(custo, rajada))
+        if usado == min(custo, rajada):
+            self.cliente.expire(chave, math.ceil(janela) + 1)
+        return 0 if usado <= rajada else inicio + janela - agora
+
+
+class Limitador:
+    """Controle de admissão: baldes por IP e por instituição, com custo por endpoint, e vagas por endpoint.
+
+    A instituição é a dona do espaço que o pedido usa (na URL ou id_espaco no
+    JSON), resolvida no servidor e memorizada; um inst_id mandado pelo cliente
+    não escolhe o balde. Pedidos que não tocam um espaço só passam pelo balde
+    do IP. As vagas de concorrência são semáforos por processo. Os contadores
+    saem em GET /metrics.
+    """
+
+    def __init__(self, backend, taxa_ip, rajada_ip, taxa_inst, rajada_inst, concorrencia, capacidade_espacos=10000):
+        self.backend = backend
+        self.taxa_ip, self.rajada_ip = taxa_ip, rajada_ip
+        self.taxa_inst, self.rajada_inst = taxa_inst, rajada_inst
+        self._vagas = {endpoint: BoundedSemaphore(concorrencia) for endpoint in CONCORRENTES} if concorrencia else {}
+        self._lock = Lock()
+        self.admitidos = defaultdict(int)  # endpoint -> total
+        self.recusados = defaultdict(int)  # (endpoint, motivo) -> total
+        self.em_andamento = defaultdict(int)  # endpoint -> pedidos com vaga ocupada
+        self.capacidade_espacos = capacidade_espacos
+        self._instituicoes = OrderedDict()  # espaço -> instituição dona
+
+    def admitir(self, endpoint, ip, inst_id):
+        """Retorna None se o pedido pode seguir, ou (motivo, segundos de espera)."""
+        custo = CUSTOS.get(endpoint, 1)
+        espera = self.backend.consumir(f'ip:{ip}', custo, self.taxa_ip, self.rajada_ip)
+        if espera:
+            return self._recusar(endpoint, 'ip', espera)
+        if inst_id is not None:
+            espera = self.backend.consumir(f'inst:{inst_id}', custo, self.taxa_inst, self.rajada_inst)
+            if espera:
+                return self._recusar(endpoint, 'instituicao', espera)
+        vaga = self._vagas.get(endpoint)
+        if vaga is not None:
+            if not vaga.acquire(blocking=False):
+                return self._recusar(endpoint, 'concorrencia', 1)
+            g.limite_vaga = (endpoint, vaga)
+        with self._lock:
+            self.admitidos[endpoint] += 1
+            if vaga is not None:
+                self.em_andamento[endpoint] += 1
+        return None
+
+    def liberar_ao_fechar(self, resposta):
+        """Devolve a vaga só quando o servidor fecha a resposta, depois da última linha de um streaming."""
+        ocupada = g.pop('limite_vaga', None)
+        if ocupada is not None:
+            resposta.call_on_close(lambda: self._devolver(ocupada))
+        return resposta
+
+    def liberar(self):
+        """Devolve a vaga de um pedido que terminou sem passar por liberar_ao_fechar (erro antes da resposta)."""
+        ocupada = g.pop('limite_vaga', None)
+        if ocupada is not None:
+            self._devolver(ocupada)
+
+    def _devolver(self, ocupada):
+        endpoint, vaga = ocupada
+        with self._lock:
+            self.em_andamento[endpoint] -= 1
+        vaga.release()
+
+    def instituicao_do_espaco(self, espaco_id):
+        """Instituição dona do espaço (None se não existe); uma consulta por espaço, depois LRU."""
+        with self._lock:
+            if espaco_id in self._instituicoes:
+                self._instituicoes.move_to_end(espaco_id)
+                return self._instituicoes[espaco_id]
+        inst_id = db.session.query(Espaco.id_inst).filter_by(id=espaco_id).scalar()
+        if inst_id is not None:
+            with self._lock:
+                self._instituicoes[espaco_id] = inst_id
+                if len(self._instituicoes) > self.capacidade_espacos:
+                    self._instituicoes.popitem(last=False)
+        return inst_id
+
+    def esquecer_espaco(self, espaco_id):
+        """Chamar ao remover um espaço: o id pode ser reaproveitado por outra instituição."""
+        with self._lock:
+            self._instituicoes.pop(espaco_id, None)
+
+    def _recusar(self, endpoint, motivo, espera):
+        with self._lock:
+            self.recusados[(endpoint, motivo)] += 1
+        return motivo, espera
+
+    def linhas_metricas(self):
+        with self._lock:
+            return [
+                '# TYPE valida_ratelimit_admitted_total counter',
+                *(f'valida_ratelimit_admitted_total{{endpoint="{e}"}} {n}' for e, n in sorted(self.admitidos.items())),
+                '# TYPE valida_ratelimit_rejected_total counter',
+                *(f'valida_ratelimit_rejected_total{{endpoint="{e}",reason="{m}"}} {n}'
+                  for (e, m), n in sorted(self.recusados.items())),
+                '# TYPE valida_ratelimit_in_flight gauge',
+                *(f'valida_ratelimit_in_flight{{endpoint="{e}"}} {n}' for e, n in sorted(self.em_andamento.items())),
+            ]
+
+
+def _ip_cliente(proxies):
+    """IP do cliente; com `proxies` proxies confiáveis na frente, lido do X-Forwarded-For."""
+    encaminhado = request.headers.get('X-Forwarded-For')
+    if proxies and encaminhado:
+        enderecos = [ip.strip() for ip in encaminhado.split(',')]
+        return enderecos[max(len(enderecos) - proxies, 0)]
+    return request.remote_addr
+
+
+def _espaco_do_pedido():
+    """Espaço usado pelo pedido: id na URL das rotas de espaço ou id_espaco no JSON das reservas."""
+    argumentos = request.view_args or {}
+    espaco_id = argumentos.get('espaco_id')
+    if espaco_id is None and request.path.startswith('/api/espacos/'):
+        espaco_id = argumentos.get('id')
+    if espaco_id is None and request.is_json:
+        dados = request.get_json(silent=True)
+        if isinstance(dados, dict):
+            espaco_id = dados.get('id_espaco')
+    return espaco_id if isinstance(espaco_id, int) and not isinstance(espaco_id, bool) else None
+
+
+def configurar_limites(app):
+    """Liga o controle de admissão (LIMITES_ATIVOS) antes de cada rota e exporta os contadores.
+
+    Com LIMITES_ATIVOS desligado nenhum hook é registrado. Chamar depois de
+    configurar_metricas, para que os 429 também entrem nas métricas.
+    """
+    if not app.config['LIMITES_ATIVOS']:
+        return
+    if app.config['LIMITES_BACKEND'] == 'redis':
+        backend = LimitesCompartilhados(cliente_compartilhado(app.config['LIMITES_URL']))
+    else:
+        backend = LimitesMemoria()
+    limitador = Limitador(
+        backend,
+        app.config['LIMITE_IP_TAXA'], app.config['LIMITE_IP_RAJADA'],
+        app.config['LIMITE_INST_TAXA'], app.config['LIMITE_INST_RAJADA'],
+        app.config['LIMITES_CONCORRENCIA'],
+    )
+    app.extensions['limites'] = limitador
+    if 'metricas' in app.extensions:
+        app.extensions['metricas'].extras.append(limitador.linhas_metricas)
+    proxies = app.config['LIMITES_PROXIES']
+
+    @app.before_request
+    def _admitir():
+        if request.endpoint is None or request.endpoint in ISENTOS or request.method == 'OPTIONS':
+            return None
+        espaco_id = _espaco_do_pedido()
+        inst_id = limitador.instituicao_do_espaco(espaco_id) if espaco_id is not None else None
+        recusa = limitador.admitir(request.endpoint, _ip_cliente(proxies), inst_id)
+        if recusa is None:
+            return None
+        motivo, espera = recusa
+        mensagem = ('Servidor ocupado, tente novamente em instantes.' if motivo == 'concorrencia'
+                    else 'Muitas requisições. Tente novamente em instantes.')
+        return jsonify({'erro': mensagem}), 429, {'Retry-After': str(max(1, math.ceil(espera)))}
+
+    # o teardown roda antes do gerador de uma resposta em streaming: a vaga vai junto com a resposta
+    app.after_request(limitador.liberar_ao_fechar)
+
+    @app.teardown_request
+    def _liberar(_erro):
+        limitador.liberar()
@@ -0,0 +1,146 @@
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from flask import Response, g, has_app_context, request
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 25, 50, 100, 500)
+
+
+class Histograma:
+    """Histograma cumulativo no formato do Prometheus."""
+    __slots__ = ('limites', 'contagens', 'soma', 'total')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * len(limites)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        indice = bisect_left(self.limites, valor)
+        if indice < len(self.contagens):
+            self.contagens[indice] += 1
+        self.soma += valor
+        self.total += 1
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}'
+        yield f'{nome}_bucket{{{rotulos},le="+Inf"}} {self.total}'
+        yield f'{nome}_sum{{{rotulos}}} {self.soma}'
+        yield f'{nome}_count{{{rotulos}}} {self.total}'
+
+
+class Metricas:
+    """Contadores por endpoint: latência, status e consultas SQL por pedido."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.pedidos = defaultdict(int)  # (endpoint, método, status) -> total
+        self.latencia = defaultdict(lambda: Histograma(BUCKETS_SEGUNDOS))
+        self.consultas = defaultdict(lambda: Histograma(BUCKETS_CONSULTAS))
+        self.tempo_sql = defaultdict(float)
+        self.consultas_lentas = 0
+        self.extras = []  # funções que devolvem linhas extras para /metrics
+
+    def registrar_pedido(self, endpoint, metodo, status, duracao, n_consultas, tempo_sql):
+        with self._lock:
+            self.pedidos[(endpoint, metodo, status)] += 1
+            self.latencia[endpoint].observar(duracao)
+            self.consultas[endpoint].observar(n_consultas)
+            self.tempo_sql[endpoint] += tempo_sql
+
+    def registrar_consulta_lenta(self):
+        with self._lock:
+            self.consultas_lentas += 1
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus."""
+        with self._lock:
+            linhas = [
+                '# TYPE valida_http_requests_total counter',
+                *(f'valida_http_requests_total{{endpoint="{e}",method="{m}",status="{s}"}} {n}'
+                  for (e, m, s), n in sorted(self.pedidos.items())),
+                '# TYPE valida_http_request_duration_seconds histogram',
+                *(linha for e, h in sorted(self.latencia.items())
+                  for linha in h.linhas('valida_http_request_duration_seconds', f'endpoint="{e}"')),
+                '# TYPE valida_sql_queries_per_request histogram',
+                *(linha for e, h in sorted(self.consultas.items())
+                  for linha in h.linhas('valida_sql_queries_per_request', f'endpoint="{e}"')),
+                '# TYPE valida_sql_duration_seconds_total counter',
+                *(f'valida_sql_duration_seconds_total{{endpoint="{e}"}} {t}' for e, t in sorted(self.tempo_sql.items())),
+                '# TYPE valida_sql_slow_queries_total counter',
+                f'valida_sql_slow_queries_total {self.consultas_lentas}',
+            ]
+        for extra in self.extras:
+            linhas.extend(extra())
+        return '\n'.join(linhas) + '\n'
+
+
+def configurar_metricas(app):
+    """Liga a instrumentação de pedidos e SQL e expõe GET /metrics.
+
+    Com METRICAS_ATIVAS desligado nada é registrado: nenhum hook de pedido,
+    nenhum evento do engine e nenhuma rota. Chamar dentro do app_context.
+    """
+    if not app.config['METRICAS_ATIVAS']:
+        return
+    metricas = Metricas()
+    app.extensions['metricas'] = metricas
+    sql_lenta = app.config['METRICAS_SQL_LENTA_MS'] / 1000
+    pedido_lento = app.config['METRICAS_PEDIDO_LENTO_MS'] / 1000
+
+    @app.before_request
+    def _iniciar_medicao():
+        g.metricas_inicio = time.perf_counter()
+        g.metricas_sql = [0, 0.0]
+
+    @app.after_request
+    def _encerrar_medicao(response):
+        inicio = g.pop('metricas_inicio', None)
+        if inicio is None:
+            return response
+        duracao = time.perf_counter() - inicio
+        n_consultas, tempo_sql = g.pop('metricas_sql')
+        endpoint = request.endpoint or 'nao_encontrado'
+        metricas.registrar_pedido(endpoint, request.method, response.status_code, duracao, n_consultas, tempo_sql)
+        if duracao > pedido_lento:
+            logger.warning('Pedido lento: %s %s %.0fms (%d consultas, %.0fms em SQL)',
+                           request.method, request.path, duracao * 1000, n_consultas, tempo_sql * 1000)
+        return response
+
+    engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metricas_inicio', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - conn.info['metricas_inicio'].pop()
+        if has_app_context() and 'metricas_sql' in g:
+            g.metricas_sql[0] += 1
+            g.metricas_sql[1] += duracao
+        if duracao > sql_lenta:
+            metricas.registrar_consulta_lenta()
+            logger.warning('Consulta lenta (%.0fms): %s', duracao * 1000, statement)
+
+    @event.listens_for(engine, 'handle_error')
+    def _erro_sql(contexto):
+        if contexto.connection is not None and contexto.connection.info.get('metricas_inicio'):
+            contexto.connection.info['metricas_inicio'].pop()
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
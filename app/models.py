@@ -1,7 +1,12 @@
 from app import db
-from datetime import datetime, timedelta, time
+from app.ocupacao import ROTULOS_MINUTO, Intervalo, formatar_dia, minuto_do_dia
+from datetime import time
 import uuid
 
+# Janela padrão de funcionamento dos espaços
+HORA_ABERTURA = time(8, 0)
+HORA_FECHAMENTO = time(22, 0)
+
 # --- Tabelas de Associação ---
 user_instituicoes = db.Table(
     'user_instituicoes',
@@ -37,12 +42,23 @@ class AccountMixin:
 class User(db.Model, AccountMixin):
     __tablename__ = 'users'
     reservas = db.relationship('Reserva', backref='user', lazy=True, cascade="all, delete-orphan")
+    reservas_arquivadas = db.relationship('ReservaArquivo', lazy=True, cascade="all, delete-orphan")
     instituicoes = db.relationship('Instituicao', secondary=user_instituicoes, back_populates='membros')
 
 class Admin(db.Model, AccountMixin):
     __tablename__ = 'admins'
     instituicoes = db.relationship('Instituicao', secondary=admin_instituicoes, back_populates='admins')
 
+class IdentidadeConta(db.Model):
+    """Email e CPF de todas as contas, únicos entre users e admins."""
+    __tablename__ = 'identidades'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(5), nullable=False)  # 'user' ou 'admin'
+    conta_id = db.Column(db.Integer, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    cpf = db.Column(db.String(14), unique=True, nullable=False)
+    __table_args__ = (db.UniqueConstraint('tipo', 'conta_id'),)
+
 class Instituicao(db.Model):
     __tablename__ = 'instituicoes'
     id = db.Column(db.Integer, primary_key=True)
@@ -74,7 +90,14 @@ class Espaco(db.Model):
     disponibilidade = db.Column(db.Boolean, default=True, nullable=False)
     duracao_padrao = db.Column(db.Integer, default=30)  # minutos
     antecedencia_maxima_dias = db.Column(db.Integer, default=7)
+    hora_abertura = db.Column(db.Time, default=HORA_ABERTURA, nullable=True)
+    hora_fechamento = db.Column(db.Time, default=HORA_FECHAMENTO, nullable=True)
     reservas = db.relationship('Reserva', backref='espaco', lazy=True, cascade="all, delete-orphan")
+    reservas_arquivadas = db.relationship('ReservaArquivo', lazy=True, cascade="all, delete-orphan")
+
+    @property
+    def modelo_slots(self):
+        return modelo_slots(self.duracao_padrao, self.hora_abertura or HORA_ABERTURA, self.hora_fechamento or HORA_FECHAMENTO)
 
     def to_dict(self):
         return {
@@ -86,25 +109,48 @@ class Espaco(db.Model):
             'multi_reservas': self.multi_reservas,
             'disponibilidade': self.disponibilidade,
             'duracao_padrao': self.duracao_padrao,
-            'antecedencia_maxima_dias': self.antecedencia_maxima_dias
+            'antecedencia_maxima_dias': self.antecedencia_maxima_dias,
+            'hora_abertura': (self.hora_abertura or HORA_ABERTURA).strftime('%H:%M'),
+            'hora_fechamento': (self.hora_fechamento or HORA_FECHAMENTO).strftime('%H:%M')
         }
 
+def _numero_do_dia(contexto):
+    return contexto.get_current_parameters()['data_reserva'].toordinal()
+
+
+def _minuto_de(coluna):
+    def padrao(contexto):
+        return minuto_do_dia(contexto.get_current_parameters()[coluna])
+    return padrao
+
+
 class Reserva(db.Model):
     __tablename__ = 'reservas'
+    __table_args__ = (
+        # checagem de conflito e horarios_disponiveis filtram por espaço + dia e comparam minutos
+        db.Index('ix_reservas_espaco_dia_minuto', 'id_espaco', 'dia_reserva', 'minuto_inicio'),
+        # ids nunca reaproveitados no SQLite (bancos novos), já que o arquivamento preserva os ids
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
     id_espaco = db.Column(db.Integer, db.ForeignKey('espacos.id'), nullable=False)
     id_user = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     data_reserva = db.Column(db.Date, nullable=False)
     hora_inicio = db.Column(db.Time, nullable=False)
     hora_fim = db.Column(db.Time, nullable=False)
+    # as mesmas data e horas em inteiros (date.toordinal() e minutos do dia), preenchidas no INSERT:
+    # filtros e checagens de conflito comparam inteiros em vez de datas/horas
+    dia_reserva = db.Column(db.Integer, nullable=False, default=_numero_do_dia)
+    minuto_inicio = db.Column(db.Integer, nullable=False, default=_minuto_de('hora_inicio'))
+    minuto_fim = db.Column(db.Integer, nullable=False, default=_minuto_de('hora_fim'))
     observacoes = db.Column(db.String(300), nullable=True)
 
     def to_dict_history(self):
         return {
             'id': self.id,
-            'data_reserva': self.data_reserva.strftime('%d/%m/%Y'),
-            'hora_inicio': self.hora_inicio.strftime('%H:%M'),
-            'hora_fim': self.hora_fim.strftime('%H:%M'),
+            'data_reserva': formatar_dia(self.dia_reserva),
+            'hora_inicio': ROTULOS_MINUTO[self.minuto_inicio],
+            'hora_fim': ROTULOS_MINUTO[self.minuto_fim],
             'observacoes': self.observacoes,
             'espaco_nome': self.espaco.nome,
             'user_nome': self.user.nome,
@@ -112,15 +158,76 @@ class Reserva(db.Model):
             'user_cpf': self.user.cpf
         }
 
+class ReservaArquivo(db.Model):
+    """Reservas passadas movidas de `reservas` pelo arquivamento (app.arquivo).
+
+    Mesmas colunas de Reserva, com o id original preservado, para que o
+    histórico leia as duas tabelas com UNION ALL. As consultas de conflito e
+    disponibilidade só olham `reservas`.
+    """
+    __tablename__ = 'reservas_arquivo'
+    __table_args__ = (
+        db.Index('ix_reservas_arquivo_espaco_dia', 'id_espaco', 'dia_reserva'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    id_espaco = db.Column(db.Integer, db.ForeignKey('espacos.id'), nullable=False)
+    id_user = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    data_reserva = db.Column(db.Date, nullable=False)
+    hora_inicio = db.Column(db.Time, nullable=False)
+    hora_fim = db.Column(db.Time, nullable=False)
+    dia_reserva = db.Column(db.Integer, nullable=False, default=_numero_do_dia)
+    minuto_inicio = db.Column(db.Integer, nullable=False, default=_minuto_de('hora_inicio'))
+    minuto_fim = db.Column(db.Integer, nullable=False, default=_minuto_de('hora_fim'))
+    observacoes = db.Column(db.String(300), nullable=True)
+
+# --- Modelos de Slots ---
+def validar_grade(duracao, abertura, fechamento):
+    """Levanta ValueError se a duração ou a janela não formam uma grade válida dentro do dia."""
+    if isinstance(duracao, bool) or not isinstance(duracao, int) or duracao <= 0:
+        raise ValueError('duracao_padrao deve ser um inteiro positivo.')
+    inicio, limite = minuto_do_dia(abertura), minuto_do_dia(fechamento)
+    if inicio >= limite:
+        raise ValueError('hora_abertura deve ser anterior a hora_fechamento.')
+    # o último slot começa antes do fechamento e pode terminar depois dele, mas não na meia-noite ou além
+    if inicio + ((limite - inicio - 1) // duracao + 1) * duracao >= 24 * 60:
+        raise ValueError('O último horário da grade terminaria na meia-noite ou depois; ajuste hora_fechamento ou duracao_padrao.')
+
+
+class ModeloSlots:
+    """Grade de slots de um dia para uma duração e janela de funcionamento.
+
+    Cada slot é guardado como (time, time), como Intervalo em minutos do dia
+    e já formatado em '%H:%M', para que as rotas não refaçam essas conversões
+    a cada pedido. A grade é montada em minutos e nunca passa da meia-noite:
+    janelas antigas gravadas antes de validar_grade perdem os slots finais.
+    """
+    __slots__ = ('slots', 'minutos', 'rotulos', 'por_inicio')
+
+    def __init__(self, duracao, abertura, fechamento):
+        limite = min(minuto_do_dia(fechamento), 24 * 60 - duracao)
+        self.minutos = tuple(Intervalo(inicio, inicio + duracao) for inicio in range(minuto_do_dia(abertura), limite, duracao))
+        self.slots = tuple((intervalo.hora_inicio, intervalo.hora_fim) for intervalo in self.minutos)
+        self.rotulos = tuple(intervalo.rotulos for intervalo in self.minutos)
+        self.por_inicio = {rotulo[0]: intervalo for rotulo, intervalo in zip(self.rotulos, self.minutos)}
+
+
+_modelos_slots = {}
+
+
+def modelo_slots(duracao=30, abertura=HORA_ABERTURA, fechamento=HORA_FECHAMENTO):
+    """Retorna o ModeloSlots memorizado para (duração, abertura, fechamento)."""
+    chave = (duracao, abertura, fechamento)
+    modelo = _modelos_slots.get(chave)
+    if modelo is None:
+        modelo = _modelos_slots[chave] = ModeloSlots(duracao, abertura, fechamento)
+    return modelo
+
+
+def invalidar_modelo_slots(duracao, abertura=HORA_ABERTURA, fechamento=HORA_FECHAMENTO):
+    _modelos_slots.pop((duracao, abertura, fechamento), None)
+
+
 # --- Função Auxiliar ---
-def gerar_slots(duracao=30):
+def gerar_slots(duracao=30, abertura=HORA_ABERTURA, fechamento=HORA_FECHAMENTO):
     """Gera uma lista de tuplas (hora_inicio, hora_fim) para um dia padrão."""
-    inicio = time(8, 0)
-    fim = time(22, 0)
-    atual = datetime.combine(datetime.today(), inicio)
-    horarios = []
-    while atual.time() < fim:
-        proximo = (atual + timedelta(minutes=duracao)).time()
-        horarios.append((atual.time(), proximo))
-        atual += timedelta(minutes=duracao)
-    return horarios
+    return list(modelo_slots(duracao, abertura, fechamento).slots)
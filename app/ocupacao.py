@@ -0,0 +1,184 @@
+import time
+from collections import OrderedDict
+from datetime import date, time as hora
+from functools import lru_cache
+from threading import Lock
+
+# 'HH:MM' de cada minuto do dia: serializar um horário é uma indexação, sem strftime
+ROTULOS_MINUTO = tuple(f'{m // 60:02d}:{m % 60:02d}' for m in range(24 * 60))
+
+
+def minuto_do_dia(t):
+    """Converte um datetime.time em minutos desde 00:00."""
+    return t.hour * 60 + t.minute
+
+
+@lru_cache(maxsize=4096)
+def formatar_dia(numero):
+    """'DD/MM/YYYY' de um número de dia (date.toordinal()); as mesmas datas se repetem muito no histórico."""
+    return date.fromordinal(numero).strftime('%d/%m/%Y')
+
+
+def _mascara(inicio, fim):
+    return ((1 << (fim - inicio)) - 1) << inicio
+
+
+class Intervalo:
+    """Intervalo [inicio, fim) em minutos do dia; fim < inicio quando vira a meia-noite.
+
+    Tipo leve para a aritmética de slots e reservas: comparações entre
+    inteiros, e os datetime.time só são montados para gravar no banco.
+    """
+    __slots__ = ('inicio', 'fim')
+
+    def __init__(self, inicio, fim):
+        self.inicio = inicio
+        self.fim = fim
+
+    @classmethod
+    def de_horas(cls, hora_inicio, hora_fim):
+        return cls(minuto_do_dia(hora_inicio), minuto_do_dia(hora_fim))
+
+    @property
+    def hora_inicio(self):
+        return hora(*divmod(self.inicio, 60))
+
+    @property
+    def hora_fim(self):
+        return hora(*divmod(self.fim, 60))
+
+    @property
+    def rotulos(self):
+        return ROTULOS_MINUTO[self.inicio], ROTULOS_MINUTO[self.fim]
+
+    def sobrepoe(self, outro):
+        # mesma comparação das consultas de conflito no banco
+        return self.inicio < outro.fim and self.fim > outro.inicio
+
+    def __iter__(self):
+        yield self.inicio
+        yield self.fim
+
+    def __eq__(self, outro):
+        return isinstance(outro, Intervalo) and self.inicio == outro.inicio and self.fim == outro.fim
+
+    def __hash__(self):
+        return hash((self.inicio, self.fim))
+
+    def __repr__(self):
+        return f'Intervalo({ROTULOS_MINUTO[self.inicio]}-{ROTULOS_MINUTO[self.fim]})'
+
+
+class OcupacaoDia:
+    """Ocupação de um espaço em uma data, em minutos do dia.
+
+    Intervalos normais (inicio < fim) ficam no bitmap, e a consulta de um slot
+    é um único AND. Intervalos que viram a meia-noite são raros e ficam numa
+    tupla à parte, avaliados com a mesma comparação usada antes do índice.
+    """
+    __slots__ = ('bitmap', 'intervalos', 'irregulares')
+
+    def __init__(self):
+        self.bitmap = 0
+        self.intervalos = ()
+        self.irregulares = ()
+
+    def adicionar(self, inicio, fim):
+        # Tuplas são substituídas (nunca alteradas) para que leitores em outras
+        # threads sempre vejam um estado consistente.
+        self.intervalos = self.intervalos + ((inicio, fim),)
+        if inicio < fim:
+            self.bitmap |= _mascara(inicio, fim)
+        else:
+            self.irregulares = self.irregulares + ((inicio, fim),)
+
+    def livre(self, inicio, fim):
+        if inicio < fim:
+            if self.bitmap & _mascara(inicio, fim):
+                return False
+            candidatos = self.irregulares
+        else:
+            candidatos = self.intervalos
+        return not any(inicio < r_fim and fim > r_inicio for r_inicio, r_fim in candidatos)
+
+
+def montar_dia(intervalos):
+    """Monta um OcupacaoDia a partir de pares (minuto_inicio, minuto_fim)."""
+    dia = OcupacaoDia()
+    for inicio, fim in intervalos:
+        dia.adicionar(inicio, fim)
+    return dia
+
+
+class IndiceOcupacao:
+    """Cache em memória (LRU) de OcupacaoDia por (espaço, data).
+
+    Cada entrada é montada uma vez a partir do banco e atualizada pelas rotas
+    que gravam reservas. O índice é por processo: com vários workers, cada um
+    mantém o seu e só enxerga as gravações feitas por ele mesmo; `ttl` (em
+    segundos) limita por quanto tempo um dia carregado vale sem ir ao banco,
+    e só pode ficar vazio com um único processo.
+    """
+
+    def __init__(self, capacidade=4096, ttl=None):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._dias = OrderedDict()  # (espaço, data) -> (OcupacaoDia, expira)
+        self._lock = Lock()
+        self._geracao = 0
+
+    def obter(self, espaco_id, data, carregar):
+        """Retorna a ocupação do dia; `carregar` devolve pares (minuto_inicio, minuto_fim) do banco"""
+        chave = (espaco_id, data)
+        with self._lock:
+            item = self._dias.get(chave)
+            if item is not None:
+                dia, expira = item
+                if expira is None or expira >= time.monotonic():
+                    self._dias.move_to_end(chave)
+                    return dia
+                del self._dias[chave]
+            geracao = self._geracao
+
+        dia = montar_dia(carregar())
+        self.guardar({chave: dia}, geracao)
+        return dia
+
+    @property
+    def geracao(self):
+        """Marca a ser lida antes de consultar o banco e repassada a guardar()."""
+        with self._lock:
+            return self._geracao
+
+    def guardar(self, dias, geracao):
+        """Guarda dias montados fora do índice, desde que nada tenha sido gravado desde `geracao`"""
+        with self._lock:
+            # Se houve gravação durante a carga, o resultado pode estar defasado:
+            # o chamador usa, mas o índice não guarda.
+            if self._geracao != geracao:
+                return
+            expira = time.monotonic() + self.ttl if self.ttl else None
+            for chave, dia in dias.items():
+                self._dias.setdefault(chave, (dia, expira))
+                self._dias.move_to_end(chave)
+            while len(self._dias) > self.capacidade:
+                self._dias.popitem(last=False)
+
+    def registrar(self, espaco_id, data, intervalo):
+        """Marca uma reserva recém-gravada no índice, se o dia já estiver carregado"""
+        with self._lock:
+            self._geracao += 1
+            item = self._dias.get((espaco_id, data))
+            if item is not None:
+                item[0].adicionar(intervalo.inicio, intervalo.fim)
+
+    def invalidar_espaco(self, espaco_id):
+        with self._lock:
+            self._geracao += 1
+            for chave in [c for c in self._dias if c[0] == espaco_id]:
+                del self._dias[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._geracao += 1
+            self._dias.clear()
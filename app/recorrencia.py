@@ -0,0 +1,84 @@
+from datetime import date, datetime, timedelta
+
+from app import db
+from app.models import Reserva
+
+MAXIMO_OCORRENCIAS = 200
+# frequência da regra -> dias entre ocorrências (multiplicado por 'intervalo')
+FREQUENCIAS = {'diaria': 1, 'semanal': 7}
+
+
+def _data(valor, campo):
+    try:
+        return datetime.strptime(str(valor), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"'{campo}' deve estar no formato YYYY-MM-DD.")
+
+
+def ler_datas(dados, maximo=MAXIMO_OCORRENCIAS):
+    """Datas das ocorrências de um pedido em lote, ordenadas e sem repetição.
+
+    Aceita uma lista explícita em 'datas' e/ou uma regra em 'recorrencia'
+    ({'frequencia': 'semanal', 'data_inicio': ..., 'data_fim': ..., 'intervalo': 1}).
+    Levanta ValueError com a mensagem para o cliente se o pedido for inválido.
+    """
+    datas = {_data(valor, 'datas') for valor in dados.get('datas') or []}
+    regra = dados.get('recorrencia')
+    if regra:
+        if not isinstance(regra, dict):
+            raise ValueError("'recorrencia' deve ser um objeto.")
+        passo = FREQUENCIAS.get(regra.get('frequencia', 'semanal'))
+        if passo is None:
+            raise ValueError(f"'frequencia' deve ser uma de {', '.join(FREQUENCIAS)}.")
+        intervalo = regra.get('intervalo') or 1
+        if not isinstance(intervalo, int) or intervalo < 1:
+            raise ValueError("'intervalo' deve ser um inteiro positivo.")
+        atual = _data(regra.get('data_inicio'), 'data_inicio')
+        fim = _data(regra.get('data_fim'), 'data_fim')
+        if fim < atual:
+            raise ValueError("'data_fim' deve ser posterior a 'data_inicio'.")
+        while atual <= fim and len(datas) <= maximo:
+            datas.add(atual)
+            atual += timedelta(days=passo * intervalo)
+    if not datas:
+        raise ValueError("Informe 'datas' ou 'recorrencia'.")
+    if len(datas) > maximo:
+        raise ValueError(f'No máximo {maximo} ocorrências por pedido.')
+    return sorted(datas)
+
+
+def planejar_ocorrencias(espaco, datas, intervalo, hoje):
+    """Classifica cada data do lote; retorna (resultados, datas livres).
+
+    Todas as datas são conferidas contra as reservas existentes com uma única
+    consulta no intervalo [primeira, última] data. Datas passadas ou além de
+    antecedencia_maxima_dias são recusadas sem consultar o banco.
+    """
+    limite = hoje + timedelta(days=espaco.antecedencia_maxima_dias or 0)
+    candidatas = [data for data in datas if hoje <= data <= limite]
+    ocupadas = set()
+    if candidatas and not espaco.multi_reservas:
+        ocupadas = {date.fromordinal(dia) for dia in db.session.scalars(
+            db.select(Reserva.dia_reserva).distinct().filter(
+                Reserva.id_espaco == espaco.id,
+                Reserva.dia_reserva >= candidatas[0].toordinal(),
+                Reserva.dia_reserva <= candidatas[-1].toordinal(),
+                Reserva.minuto_inicio < intervalo.fim,
+                Reserva.minuto_fim > intervalo.inicio
+            )
+        )}
+
+    resultados, livres = [], []
+    for data in datas:
+        resultado = {'data': data.isoformat()}
+        if data < hoje:
+            resultado.update(status='recusada', erro='Data no passado.')
+        elif data > limite:
+            resultado.update(status='recusada', erro=f'Além da antecedência máxima de {espaco.antecedencia_maxima_dias} dias.')
+        elif data in ocupadas:
+            resultado.update(status='conflito', erro='Este horário já está reservado.')
+        else:
+            resultado['status'] = 'criada'
+            livres.append(data)
+        resultados.append(resultado)
+    return resultados, livres
@@ -1,15 +1,95 @@
-from flask import render_template, request, jsonify, abort
+from flask import render_template, request, jsonify, abort, Response, stream_with_context
 
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from sqlalchemy import insert, literal, select
 from app import db
-from app.models import User, Admin, Instituicao, Espaco, Reserva, gerar_slots
+from app.models import User, Admin, Instituicao, Espaco, Reserva, HORA_ABERTURA, HORA_FECHAMENTO, invalidar_modelo_slots, validar_grade
+from app.ocupacao import Intervalo, minuto_do_dia, montar_dia
+from app.banco import travar_espaco
+from app.senhas import FilaSenhasCheia
+from app.contas import ContaDuplicada, conflito_cadastro, salvar_conta
+from app.importacao import ler_lote, importar_usuarios, importar_espacos
+from app.vinculos import vinculado, vincular, instituicoes_da_conta
+from app.historico import consulta_historico, historico_to_dict, exportar_ndjson, exportar_csv
+from app.eventos import canal_horarios, canal_espaco, fluxo_sse
+from app.recorrencia import ler_datas, planejar_ocorrencias
+from app.analitica import PERIODO_MAXIMO_DIAS, TOP_USUARIOS, carregar_agregados, datas_do_periodo, relatorio_espaco
 
 import uuid
 
+# Tamanho de página do histórico de reservas (GET /api/reservas)
+LIMITE_HISTORICO = 500
+LIMITE_HISTORICO_MAXIMO = 5000
+
+def _slots_livres(modelo, dia):
+    ''' Filtra os slots do modelo que não colidem com nenhuma reserva do dia '''
+    return [
+        {'inicio': inicio, 'fim': fim}
+        for (inicio, fim), slot in zip(modelo.rotulos, modelo.minutos)
+        if dia.livre(slot.inicio, slot.fim)
+    ]
+
+
+def _slots_ocupados(modelo, intervalo):
+    ''' Slots do modelo que colidem com o intervalo de uma nova reserva (o delta publicado no SSE) '''
+    dia = montar_dia([intervalo])
+    return [
+        {'inicio': inicio, 'fim': fim}
+        for (inicio, fim), slot in zip(modelo.rotulos, modelo.minutos)
+        if not dia.livre(slot.inicio, slot.fim)
+    ]
+
+
+def _horario_da_reserva(espaco, hora_inicio):
+    ''' Intervalo de uma reserva que começa em hora_inicio (HH:MM); levanta ValueError se inválida '''
+    if not isinstance(hora_inicio, str):
+        raise ValueError('hora_inicio deve ser um texto no formato HH:MM.')
+    slot = espaco.modelo_slots.por_inicio.get(hora_inicio)
+    if slot:
+        return slot
+    # horário fora da grade do espaço: calcula o fim a partir da duração
+    inicio = minuto_do_dia(datetime.strptime(hora_inicio, '%H:%M').time())
+    return Intervalo(inicio, (inicio + espaco.duracao_padrao) % (24 * 60))
+
+
+def _ler_periodo():
+    ''' Lê data_inicio/data_fim (YYYY-MM-DD, opcionais) da query string; levanta ValueError se inválidas '''
+    data_inicio = request.args.get('data_inicio')
+    data_fim = request.args.get('data_fim')
+    return (
+        datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else None,
+        datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else None
+    )
+
+
+def _grade_funcionamento(data, duracao, abertura, fechamento):
+    ''' Lê duracao_padrao e hora_abertura/hora_fechamento ('HH:MM') do payload, mantendo os valores atuais se ausentes;
+    levanta ValueError com a mensagem para o cliente '''
+    try:
+        if data.get('hora_abertura'):
+            abertura = datetime.strptime(data['hora_abertura'], '%H:%M').time()
+        if data.get('hora_fechamento'):
+            fechamento = datetime.strptime(data['hora_fechamento'], '%H:%M').time()
+    except (ValueError, TypeError):
+        raise ValueError('Janela de funcionamento inválida. Use HH:MM, com abertura antes do fechamento.') from None
+    duracao = data.get('duracao_padrao', duracao)
+    validar_grade(duracao, abertura, fechamento)
+    return duracao, abertura, fechamento
 
 
 def init_routes(app):
+    ocupacao = app.extensions['ocupacao']
+    analitica = app.extensions['analitica']
+    senhas = app.extensions['senhas']
+    cache = app.extensions['cache']
+    eventos = app.extensions['eventos']
+
+    @app.errorhandler(FilaSenhasCheia)
+    def fila_senhas_cheia(e):
+        return jsonify({'erro': 'Servidor ocupado, tente novamente em instantes.'}), 429, {'Retry-After': '1'}
 
     # --- ROTAS HTML ---
     # Rotas para renderizar páginas HTML
@@ -56,8 +136,9 @@ def init_routes(app):
         nova_inst = Instituicao(nome=nome, cnpj=cnpj, email=email, token=token)
         db.session.add(nova_inst)
         db.session.commit()
+        cache.invalidar_instituicoes(cnpj)
 
-        admin.instituicoes.append(nova_inst)
+        vincular('admin', admin.id, nova_inst.id)
         admin.active_inst_id = nova_inst.id
         db.session.commit()
 
@@ -70,11 +151,14 @@ def init_routes(app):
     def listar_instituicoes():
         ''' Lista todas as instituições ou filtra por CNPJ  '''
         cnpj = request.args.get('cnpj')
-        if cnpj:
-            insts = Instituicao.query.filter_by(cnpj=cnpj).all()
-        else:
-            insts = Instituicao.query.all()
-        return jsonify([i.to_dict() for i in insts])
+
+        def gerar():
+            if cnpj:
+                insts = Instituicao.query.filter_by(cnpj=cnpj).all()
+            else:
+                insts = Instituicao.query.all()
+            return jsonify([i.to_dict() for i in insts])
+        return cache.responder(cache.chave_instituicoes(cnpj), gerar)
 
     @app.route('/api/instituicoes/<int:inst_id>/token', methods=['GET'])
     def get_instituicao_token(inst_id):
@@ -85,7 +169,7 @@ def init_routes(app):
             admin = Admin.query.get(admin_id)
             if not admin:
                 return jsonify({'erro': 'Admin não encontrado.'}), 404
-            if inst not in admin.instituicoes:
+            if not vinculado('admin', admin.id, inst.id):
                 return jsonify({'erro': 'Admin não vinculado a essa instituição.'}), 403
             return jsonify({'token': inst.token}), 200
         return jsonify({'erro': 'admin_id é necessário para acessar o token.'}), 400
@@ -110,9 +194,8 @@ def init_routes(app):
             admin = Admin.query.get(admin_id)
             if not admin:
                 return jsonify({'erro': 'Admin não encontrado.'}), 404
-            if inst in admin.instituicoes:
+            if not vincular('admin', admin.id, inst.id):
                 return jsonify({'mensagem': 'Admin já vinculado a essa instituição.'}), 200
-            admin.instituicoes.append(inst)
             admin.active_inst_id = inst.id
             db.session.commit()
             return jsonify({'mensagem': f'Admin vinculado à instituição {inst.nome}', 'instituicao': inst.to_dict()}), 200
@@ -121,9 +204,8 @@ def init_routes(app):
             user = User.query.get(user_id)
             if not user:
                 return jsonify({'erro': 'User não encontrado.'}), 404
-            if inst in user.instituicoes:
+            if not vincular('user', user.id, inst.id):
                 return jsonify({'mensagem': 'Usuário já vinculado a essa instituição.'}), 200
-            user.instituicoes.append(inst)
             user.active_inst_id = inst.id
             db.session.commit()
             return jsonify({'mensagem': f'Usuário vinculado à instituição {inst.nome}', 'instituicao': inst.to_dict()}), 200
@@ -137,7 +219,7 @@ def init_routes(app):
 
         user = User.query.get_or_404(user_id)
         inst = Instituicao.query.get(inst_id)
-        if not inst or inst not in user.instituicoes:
+        if not inst or not vinculado('user', user.id, inst.id):
             return jsonify({'erro': 'Instituição não encontrada ou não vinculada ao usuário.'}), 404
         
         user.active_inst_id = inst.id
@@ -155,24 +237,44 @@ def init_routes(app):
         inst = Instituicao.query.get(inst_id)
         if not admin or not inst:
             return jsonify({'erro': 'Admin ou instituição não encontrados.'}), 404
-        if inst in admin.instituicoes:
+        if not vincular('admin', admin.id, inst.id):
             return jsonify({'mensagem': 'Admin já vinculado.'}), 200
-        admin.instituicoes.append(inst)
         admin.active_inst_id = inst.id
         db.session.commit()
         return jsonify({'mensagem': f'{admin.nome} vinculado à instituição {inst.nome}.'}), 200
 
+    @app.route('/api/instituicoes/<int:inst_id>/importar/<tipo>', methods=['POST'])
+    def importar_lote(inst_id, tipo):
+        ''' Importa usuários ou espaços em lote (lista JSON ou CSV com cabeçalho) para a instituição '''
+        if tipo not in ('usuarios', 'espacos'):
+            abort(404)
+        Instituicao.query.get_or_404(inst_id)
+        formato = 'csv' if request.mimetype == 'text/csv' else 'json'
+        try:
+            linhas = ler_lote(request.get_data(as_text=True), formato)
+        except ValueError as e:
+            return jsonify({'erro': 'Lote inválido.', 'detalhe': str(e)}), 400
+
+        if tipo == 'usuarios':
+            relatorio = importar_usuarios(linhas, inst_id, senhas)
+        else:
+            relatorio = importar_espacos(linhas, inst_id)
+            cache.invalidar_espacos(inst_id)
+        return jsonify(relatorio), 200
 
 
     # --- API: ESPAÇOS ---
     @app.route('/api/espacos', methods=['GET'])
     def get_espacos():
         inst_id = request.args.get('inst_id', type=int)
-        query = Espaco.query
-        if inst_id:
-            query = query.filter_by(id_inst=inst_id)
-        espacos = query.all()
-        return jsonify([e.to_dict() for e in espacos]), 200
+
+        def gerar():
+            query = Espaco.query
+            if inst_id:
+                query = query.filter_by(id_inst=inst_id)
+            espacos = query.all()
+            return jsonify([e.to_dict() for e in espacos]), 200
+        return cache.responder(cache.chave_espacos(inst_id), gerar)
 
 
     @app.route('/api/espacos', methods=['POST'])
@@ -181,6 +283,10 @@ def init_routes(app):
         data = request.get_json()
         if not data or not all(k in data for k in ['id_inst', 'nome', 'tipo']):
             abort(400, description="Faltando 'id_inst', 'nome' ou 'tipo'.")
+        try:
+            duracao, abertura, fechamento = _grade_funcionamento(data, 30, HORA_ABERTURA, HORA_FECHAMENTO)
+        except ValueError as e:
+            abort(400, description=str(e))
         novo_espaco = Espaco(
             id_inst=data['id_inst'],
             nome=data['nome'],
@@ -188,11 +294,14 @@ def init_routes(app):
             descricao=data.get('descricao', ''),
             multi_reservas=data.get('multi_reservas', False),
             disponibilidade=data.get('disponibilidade', True),
-            duracao_padrao=data.get('duracao_padrao', 30),
-            antecedencia_maxima_dias=data.get('antecedencia_maxima_dias', 7)
+            duracao_padrao=duracao,
+            antecedencia_maxima_dias=data.get('antecedencia_maxima_dias', 7),
+            hora_abertura=abertura,
+            hora_fechamento=fechamento
         )
         db.session.add(novo_espaco)
         db.session.commit()
+        cache.invalidar_espacos(novo_espaco.id_inst)
         return jsonify(novo_espaco.to_dict()), 201
 
     @app.route('/api/espacos/<int:id>', methods=['PUT'])
@@ -200,21 +309,42 @@ def init_routes(app):
         ''' Atualiza os detalhes de um espaço '''
         espaco = Espaco.query.get_or_404(id)
         data = request.get_json()
+        abertura_antiga = espaco.hora_abertura or HORA_ABERTURA
+        fechamento_antigo = espaco.hora_fechamento or HORA_FECHAMENTO
+        duracao_antiga = espaco.duracao_padrao
+        try:
+            espaco.duracao_padrao, espaco.hora_abertura, espaco.hora_fechamento = _grade_funcionamento(
+                data, duracao_antiga, abertura_antiga, fechamento_antigo)
+        except ValueError as e:
+            abort(400, description=str(e))
         espaco.nome = data.get('nome', espaco.nome)
         espaco.descricao = data.get('descricao', espaco.descricao)
         espaco.tipo = data.get('tipo', espaco.tipo)
         espaco.disponibilidade = data.get('disponibilidade', espaco.disponibilidade)
-        espaco.duracao_padrao = data.get('duracao_padrao', espaco.duracao_padrao)
         espaco.antecedencia_maxima_dias = data.get('antecedencia_maxima_dias', espaco.antecedencia_maxima_dias)
         db.session.commit()
+        cache.invalidar_espacos(espaco.id_inst)
+        if (duracao_antiga, abertura_antiga, fechamento_antigo) != (espaco.duracao_padrao, espaco.hora_abertura, espaco.hora_fechamento):
+            invalidar_modelo_slots(duracao_antiga, abertura_antiga, fechamento_antigo)
+            cache.invalidar_horarios(espaco.id)
+            # a grade mudou para todas as datas: os clientes buscam a lista de novo
+            eventos.publicar(canal_espaco(espaco.id_inst, espaco.id), {'tipo': 'grade'})
         return jsonify(espaco.to_dict()), 200
 
     @app.route('/api/espacos/<int:id>', methods=['DELETE'])
     def delete_espaco(id):
         ''' Deleta um espaço '''
         espaco = Espaco.query.get_or_404(id)
+        inst_id = espaco.id_inst
         db.session.delete(espaco)
         db.session.commit()
+        ocupacao.invalidar_espaco(id)
+        analitica.invalidar_espaco(id)
+        if 'limites' in app.extensions:
+            app.extensions['limites'].esquecer_espaco(id)
+        cache.invalidar_espacos(inst_id)
+        cache.invalidar_horarios(id)
+        eventos.publicar(canal_espaco(inst_id, id), {'tipo': 'removido'})
         return jsonify({'message': 'Espaço deletado com sucesso.'}), 200
 
     @app.route('/api/espacos/<int:espaco_id>/horarios_disponiveis', methods=['GET'])
@@ -228,16 +358,107 @@ def init_routes(app):
         except ValueError:
             return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD.'}), 400
 
+        def gerar():
+            espaco = Espaco.query.get_or_404(espaco_id)
+            dia = ocupacao.obter(espaco_id, data_obj, lambda: db.session.query(Reserva.minuto_inicio, Reserva.minuto_fim).filter_by(id_espaco=espaco_id, dia_reserva=data_obj.toordinal()).all())
+            return jsonify(_slots_livres(espaco.modelo_slots, dia))
+        # a lista sai do índice de ocupação do processo, que pode estar até OCUPACAO_TTL atrás de outro
+        # worker: a entrada no cache (por processo ou compartilhado) não vale mais do que isso
+        return cache.responder(cache.chave_horarios(espaco_id, data_obj.isoformat()), gerar, ttl=app.config['OCUPACAO_TTL'])
+
+    @app.route('/api/espacos/<int:espaco_id>/horarios/stream', methods=['GET'])
+    def stream_horarios(espaco_id):
+        ''' Fluxo SSE com as mudanças dos horários de um espaço em uma data (?data=YYYY-MM-DD) '''
+        data_str = request.args.get('data')
+        if not data_str:
+            return jsonify({'erro': 'A data é obrigatória'}), 400
+        try:
+            data_obj = datetime.strptime(data_str, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD.'}), 400
         espaco = Espaco.query.get_or_404(espaco_id)
-        todos_slots = gerar_slots(espaco.duracao_padrao)
-        reservas_no_dia = Reserva.query.filter_by(id_espaco=espaco_id, data_reserva=data_obj).all()
-        horarios_reservados = {(r.hora_inicio, r.hora_fim) for r in reservas_no_dia}
-        slots_disponiveis = [
-            {'inicio': inicio.strftime('%H:%M'), 'fim': fim.strftime('%H:%M')}
-            for inicio, fim in todos_slots
-            if not any(inicio < r_fim and fim > r_inicio for r_inicio, r_fim in horarios_reservados)
-        ]
-        return jsonify(slots_disponiveis)
+        canais = (canal_horarios(espaco.id_inst, espaco.id, data_obj.isoformat()), canal_espaco(espaco.id_inst, espaco.id))
+        if not eventos.abrir_fluxo():
+            # sem vaga: o cliente passa a consultar horarios_disponiveis periodicamente
+            return jsonify({'erro': 'Muitas conexões em tempo real abertas. Tente novamente em instantes.'}), 503, {'Retry-After': '30'}
+        fila = eventos.assinar(*canais)
+        resposta = Response(fluxo_sse(eventos, fila, canais, duracao_maxima=app.config['EVENTOS_FLUXO_SEGUNDOS']),
+                            mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        # assinatura e vaga são devolvidas quando o servidor fecha a resposta, mesmo se o gerador nem chegou a rodar
+        resposta.call_on_close(lambda: eventos.fechar_fluxo(fila, *canais))
+        return resposta
+
+    @app.route('/api/disponibilidade', methods=['GET'])
+    def get_disponibilidade():
+        ''' Retorna os horários disponíveis de vários espaços de uma instituição em um intervalo de datas '''
+        inst_id = request.args.get('inst_id', type=int)
+        if not inst_id:
+            return jsonify({'erro': 'inst_id é obrigatório.'}), 400
+
+        hoje = date.today()
+        try:
+            data_inicio = datetime.strptime(request.args['data_inicio'], '%Y-%m-%d').date() if request.args.get('data_inicio') else hoje
+            data_fim = datetime.strptime(request.args['data_fim'], '%Y-%m-%d').date() if request.args.get('data_fim') else data_inicio
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD.'}), 400
+        if data_fim < data_inicio:
+            return jsonify({'erro': 'data_fim deve ser posterior a data_inicio.'}), 400
+        data_inicio = max(data_inicio, hoje)
+
+        query = Espaco.query.filter_by(id_inst=inst_id)
+        ids = request.args.get('espacos')
+        if ids:
+            try:
+                ids = [int(i) for i in ids.split(',') if i.strip()]
+            except ValueError:
+                return jsonify({'erro': 'espacos deve ser uma lista de ids separados por vírgula.'}), 400
+            query = query.filter(Espaco.id.in_(ids))
+        espacos = query.all()
+
+        # Cada espaço só aceita consultas até a sua antecedência máxima
+        limites = {e.id: min(data_fim, hoje + timedelta(days=e.antecedencia_maxima_dias or 0)) for e in espacos}
+        ultimo_dia = max(limites.values(), default=data_inicio)
+
+        # Uma única consulta para todos os espaços e datas, agrupada por (espaço, data)
+        geracao = ocupacao.geracao
+        agrupadas = {}
+        if espacos and ultimo_dia >= data_inicio:
+            reservas = db.session.query(Reserva.id_espaco, Reserva.dia_reserva, Reserva.minuto_inicio, Reserva.minuto_fim).filter(
+                Reserva.id_espaco.in_(limites.keys()),
+                Reserva.dia_reserva >= data_inicio.toordinal(),
+                Reserva.dia_reserva <= ultimo_dia.toordinal()
+            ).order_by(Reserva.id_espaco, Reserva.dia_reserva).all()
+            agrupadas = {
+                chave: [(inicio, fim) for _, _, inicio, fim in grupo]
+                for chave, grupo in groupby(reservas, key=itemgetter(0, 1))
+            }
+
+        dias_montados = {}
+        resultado = []
+        for espaco in espacos:
+            modelo = espaco.modelo_slots
+            dias = {}
+            data_atual = data_inicio
+            while data_atual <= limites[espaco.id]:
+                dia = montar_dia(agrupadas.get((espaco.id, data_atual.toordinal()), ()))
+                dias_montados[(espaco.id, data_atual)] = dia
+                dias[data_atual.strftime('%Y-%m-%d')] = _slots_livres(modelo, dia)
+                data_atual += timedelta(days=1)
+            resultado.append({
+                'id': espaco.id,
+                'nome': espaco.nome,
+                'disponibilidade': espaco.disponibilidade,
+                'duracao_padrao': espaco.duracao_padrao,
+                'dias': dias
+            })
+        ocupacao.guardar(dias_montados, geracao)
+
+        return jsonify({
+            'inst_id': inst_id,
+            'data_inicio': data_inicio.strftime('%Y-%m-%d'),
+            'data_fim': data_fim.strftime('%Y-%m-%d'),
+            'espacos': resultado
+        }), 200
 
 
     # --- API: AUTENTICAÇÃO ---
@@ -247,14 +468,13 @@ def init_routes(app):
         if not data or not all(k in data for k in ['cpf', 'nome', 'email', 'senha']):
             abort(400, description="Faltando dados para cadastro de usuário.")
 
-        # Verifica duplicidade de email ou CPF
-        if User.query.filter_by(email=data['email']).first() or Admin.query.filter_by(email=data['email']).first():
-            abort(409, description="E-mail já cadastrado.")
-        if User.query.filter_by(cpf=data['cpf']).first() or Admin.query.filter_by(cpf=data['cpf']).first():
-            abort(409, description="CPF já cadastrado.")
+        # Verifica duplicidade de email ou CPF (users e admins, numa única consulta)
+        conflito = conflito_cadastro(data['email'], data['cpf'])
+        if conflito:
+            abort(409, description=conflito)
 
-        # Gera hash da senha com Werkzeug
-        hashed_password = generate_password_hash(data['senha'], method='pbkdf2:sha256')
+        # Gera hash da senha com Werkzeug (no pool de processos)
+        hashed_password = senhas.gerar_hash(data['senha'])
         new_user = User(cpf=data['cpf'], nome=data['nome'], email=data['email'], senha=hashed_password)
 
         # Vincula a instituição, se fornecida
@@ -271,8 +491,10 @@ def init_routes(app):
                 new_user.instituicoes.append(inst)
                 new_user.active_inst_id = inst.id
 
-        db.session.add(new_user)
-        db.session.commit()
+        try:
+            salvar_conta(new_user, 'user')
+        except ContaDuplicada as e:
+            abort(409, description=str(e))
         return jsonify({'message': 'Usuário criado com sucesso!', 'user': new_user.to_dict()}), 201
 
 
@@ -283,14 +505,13 @@ def init_routes(app):
         if not data or not all(k in data for k in ['cpf', 'nome', 'email', 'senha']):
             abort(400, description="Faltando dados para cadastro de administrador.")
 
-        # Verifica duplicidade de email ou CPF
-        if User.query.filter_by(email=data['email']).first() or Admin.query.filter_by(email=data['email']).first():
-            abort(409, description="E-mail já cadastrado.")
-        if User.query.filter_by(cpf=data['cpf']).first() or Admin.query.filter_by(cpf=data['cpf']).first():
-            abort(409, description="CPF já cadastrado.")
+        # Verifica duplicidade de email ou CPF (users e admins, numa única consulta)
+        conflito = conflito_cadastro(data['email'], data['cpf'])
+        if conflito:
+            abort(409, description=conflito)
 
-        # Gera hash da senha com Werkzeug
-        hashed_password = generate_password_hash(data['senha'], method='pbkdf2:sha256')
+        # Gera hash da senha com Werkzeug (no pool de processos)
+        hashed_password = senhas.gerar_hash(data['senha'])
         new_admin = Admin(cpf=data['cpf'], nome=data['nome'], email=data['email'], senha=hashed_password)
 
         # Vincula a instituição, se fornecida
@@ -307,8 +528,10 @@ def init_routes(app):
                 new_admin.instituicoes.append(inst)
                 new_admin.active_inst_id = inst.id
 
-        db.session.add(new_admin)
-        db.session.commit()
+        try:
+            salvar_conta(new_admin, 'admin')
+        except ContaDuplicada as e:
+            abort(409, description=str(e))
         return jsonify({'message': 'Administrador criado com sucesso!', 'admin': new_admin.to_dict()}), 201
     
     @app.route('/api/login', methods=['POST'])
@@ -317,23 +540,29 @@ def init_routes(app):
         email = data.get('email')
         senha = data.get('senha')
 
-        # Busca usuário ou admin pelo email
-        user = User.query.filter_by(email=email).first()
-        admin = Admin.query.filter_by(email=email).first()
-
-        # Verifica senha usando Werkzeug
-        if user and check_password_hash(user.senha, senha):
+        if not email or not senha:
+            return jsonify({'message': 'Credenciais inválidas'}), 401
+
+        # Busca usuário e admin pelo email numa única consulta (usuário tem precedência)
+        contas = db.session.execute(
+            select(literal('user').label('tipo'), User.id, User.senha).where(User.email == email)
+            .union_all(select(literal('admin').label('tipo'), Admin.id, Admin.senha).where(Admin.email == email))
+        ).all()
+        contas.sort(key=lambda conta: conta.tipo != 'user')
+
+        for tipo, conta_id, senha_hash in contas:
+            # Verifica senha usando Werkzeug (no pool de processos)
+            if not senhas.verificar(senha_hash, senha):
+                continue
+            conta = db.session.get(User if tipo == 'user' else Admin, conta_id)
+            if senhas.precisa_rehash(senha_hash):
+                # parâmetros de custo mudaram desde o cadastro: regrava o hash
+                conta.senha = senhas.gerar_hash(senha)
+                db.session.commit()
             return jsonify({
-                'user_type': 'user',
-                'user_data': user.to_dict(),
-                'instituicoes': [i.to_dict() for i in user.instituicoes]
-            })
-
-        if admin and check_password_hash(admin.senha, senha):
-            return jsonify({
-                'user_type': 'admin',
-                'user_data': admin.to_dict(),
-                'instituicoes': [i.to_dict() for i in admin.instituicoes]
+                'user_type': tipo,
+                'user_data': conta.to_dict(),
+                'instituicoes': instituicoes_da_conta(tipo, conta_id)
             })
 
         return jsonify({'message': 'Credenciais inválidas'}), 401
@@ -343,13 +572,49 @@ def init_routes(app):
     # --- API: RESERVAS ---
     @app.route('/api/reservas', methods=['GET'])
     def listar_reservas():
-        ''' Lista todas as reservas ou filtra por instituição '''
+        ''' Lista reservas (paginadas por id) com filtro opcional por instituição e período '''
+        inst_id = request.args.get('inst_id', type=int)
+        apos_id = request.args.get('apos_id', type=int)
+        limite = min(request.args.get('limite', LIMITE_HISTORICO, type=int), LIMITE_HISTORICO_MAXIMO)
+        try:
+            data_inicio, data_fim = _ler_periodo()
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD.'}), 400
+        if limite < 1:
+            return jsonify({'erro': 'limite deve ser positivo.'}), 400
+
+        linhas = consulta_historico(inst_id, data_inicio, data_fim, apos_id, limite).all()
+
+        resposta = jsonify([historico_to_dict(linha) for linha in linhas])
+        # Página cheia: o cliente continua a partir do último id com ?apos_id=
+        if len(linhas) == limite:
+            resposta.headers['X-Proximo-Cursor'] = str(linhas[-1][0])
+        return resposta, 200
+
+    @app.route('/api/reservas/export', methods=['GET'])
+    def exportar_reservas():
+        ''' Exporta o histórico de reservas de uma instituição em NDJSON ou CSV, linha a linha '''
         inst_id = request.args.get('inst_id', type=int)
-        query = Reserva.query
-        if inst_id:
-            query = query.join(Espaco).filter(Espaco.id_inst == inst_id)
-        reservas = query.all()
-        return jsonify([r.to_dict_history() for r in reservas]), 200
+        formato = request.args.get('formato', 'ndjson')
+        if not inst_id:
+            return jsonify({'erro': 'inst_id é obrigatório.'}), 400
+        if formato not in ('ndjson', 'csv'):
+            return jsonify({'erro': "formato deve ser 'ndjson' ou 'csv'."}), 400
+        try:
+            data_inicio, data_fim = _ler_periodo()
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD.'}), 400
+
+        # yield_per liga stream_results: o driver entrega as linhas em lotes,
+        # sem materializar o resultado inteiro em memória
+        linhas = consulta_historico(inst_id, data_inicio, data_fim).yield_per(1000)
+        if formato == 'csv':
+            corpo, mimetype = exportar_csv(linhas), 'text/csv'
+        else:
+            corpo, mimetype = exportar_ndjson(linhas), 'application/x-ndjson'
+        return Response(stream_with_context(corpo), mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=reservas_{inst_id}.{formato}'
+        })
 
     @app.route('/api/reservas', methods=['POST'])
     def criar_reserva():
@@ -364,35 +629,146 @@ def init_routes(app):
         if not all([id_espaco, user_email, data_reserva, hora_inicio]):
             return jsonify({'erro':'Dados insuficientes'}), 400
 
+        # A transação começa bloqueando o espaço, então a checagem de conflito e o
+        # INSERT abaixo não intercalam com outra reserva concorrente do mesmo espaço.
+        esp = travar_espaco(id_espaco)
+
         user = User.query.filter_by(email=user_email).first()
         if not user:
             return jsonify({'erro':'Usuário não encontrado'}), 404
 
-        esp = Espaco.query.get(id_espaco)
         if not esp:
             return jsonify({'erro':'Espaço não encontrado'}), 404
 
         try:
             data_obj = datetime.fromisoformat(data_reserva).date()
-            hora_inicio_obj = datetime.strptime(hora_inicio, '%H:%M').time()
-            dur = esp.duracao_padrao
-            hora_fim_dt = (datetime.combine(data_obj, hora_inicio_obj) + timedelta(minutes=dur)).time()
+            intervalo = _horario_da_reserva(esp, hora_inicio)
         except Exception as e:
             return jsonify({'erro':'Formato de data/hora inválido', 'detalhe': str(e)}), 400
-
-        # Verificação de conflito
-        conflito = Reserva.query.filter(
-            Reserva.id_espaco == id_espaco,
-            Reserva.data_reserva == data_obj,
-            Reserva.hora_inicio < hora_fim_dt,
-            Reserva.hora_fim > hora_inicio_obj
-        ).first()
-        if conflito and not esp.multi_reservas:
-            return jsonify({'erro': 'Este horário já está reservado.'}), 409
-
-        reserva = Reserva(id_espaco=id_espaco, id_user=user.id, data_reserva=data_obj, hora_inicio=hora_inicio_obj, hora_fim=hora_fim_dt, observacoes=observacoes)
+        # dias passados podem já ter sido arquivados, e a checagem abaixo só lê `reservas`
+        if data_obj < date.today():
+            return jsonify({'erro': 'Data no passado.'}), 400
+
+        # Verificação de conflito (usa o índice (id_espaco, dia_reserva, minuto_inicio))
+        if not esp.multi_reservas:
+            conflito = db.session.query(Reserva.id).filter(
+                Reserva.id_espaco == esp.id,
+                Reserva.dia_reserva == data_obj.toordinal(),
+                Reserva.minuto_inicio < intervalo.fim,
+                Reserva.minuto_fim > intervalo.inicio
+            ).first()
+            if conflito:
+                return jsonify({'erro': 'Este horário já está reservado.'}), 409
+
+        user_id = user.id  # lido antes do commit, que expira a instância e faria o acesso ir ao banco
+        reserva = Reserva(id_espaco=esp.id, id_user=user_id, data_reserva=data_obj, hora_inicio=intervalo.hora_inicio, hora_fim=intervalo.hora_fim, observacoes=observacoes)
         db.session.add(reserva)
         db.session.commit()
+        ocupacao.registrar(esp.id, data_obj, intervalo)
+        analitica.registrar(esp.id, data_obj, intervalo, user_id)
+        cache.invalidar_horarios(esp.id, data_obj.isoformat())
+        eventos.publicar(canal_horarios(esp.id_inst, esp.id, data_obj.isoformat()),
+                         {'tipo': 'ocupado', 'slots': _slots_ocupados(esp.modelo_slots, intervalo)})
         return jsonify({'mensagem':'Reserva criada com sucesso'}), 201
 
+    @app.route('/api/reservas/lote', methods=['POST'])
+    def criar_reservas_lote():
+        ''' Cria várias reservas do mesmo horário (datas explícitas ou recorrência) em uma única transação '''
+        data = request.get_json()
+        id_espaco = data.get('id_espaco')
+        user_email = data.get('user_email')
+        hora_inicio = data.get('hora_inicio')
+        observacoes = data.get('observacoes', '')
+        tudo_ou_nada = bool(data.get('tudo_ou_nada', False))
+
+        if not all([id_espaco, user_email, hora_inicio]):
+            return jsonify({'erro':'Dados insuficientes'}), 400
+        try:
+            datas = ler_datas(data)
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
+
+        # mesmo bloqueio de criar_reserva: a checagem e os INSERTs do lote não intercalam com outras reservas do espaço
+        esp = travar_espaco(id_espaco)
+
+        user = User.query.filter_by(email=user_email).first()
+        if not user:
+            return jsonify({'erro':'Usuário não encontrado'}), 404
+        if not esp:
+            return jsonify({'erro':'Espaço não encontrado'}), 404
+
+        try:
+            intervalo = _horario_da_reserva(esp, hora_inicio)
+        except ValueError as e:
+            return jsonify({'erro':'Formato de hora inválido', 'detalhe': str(e)}), 400
+
+        resultados, livres = planejar_ocorrencias(esp, datas, intervalo, date.today())
+        if not livres or (tudo_ou_nada and len(livres) < len(datas)):
+            db.session.rollback()
+            for resultado in resultados:
+                if resultado['status'] == 'criada':
+                    resultado.update(status='cancelada', erro='Lote recusado: outras ocorrências falharam.')
+            return jsonify({'criadas': 0, 'resultados': resultados}), 409
+
+        user_id = user.id
+        db.session.execute(insert(Reserva), [
+            {'id_espaco': esp.id, 'id_user': user_id, 'data_reserva': data_obj, 'hora_inicio': intervalo.hora_inicio,
+             'hora_fim': intervalo.hora_fim, 'observacoes': observacoes}
+            for data_obj in livres
+        ])
+        db.session.commit()
+
+        slots = _slots_ocupados(esp.modelo_slots, intervalo)
+        for data_obj in livres:
+            ocupacao.registrar(esp.id, data_obj, intervalo)
+            analitica.registrar(esp.id, data_obj, intervalo, user_id)
+            cache.invalidar_horarios(esp.id, data_obj.isoformat())
+            eventos.publicar(canal_horarios(esp.id_inst, esp.id, data_obj.isoformat()), {'tipo': 'ocupado', 'slots': slots})
+        return jsonify({'criadas': len(livres), 'resultados': resultados}), 201
+
+
+    # --- API: ANALÍTICA ---
+    @app.route('/api/instituicoes/<int:inst_id>/ocupacao', methods=['GET'])
+    def relatorio_ocupacao(inst_id):
+        ''' Ocupação dos espaços da instituição num período: % por dia e semana, horários de pico e usuários que mais reservam '''
+        hoje = date.today()
+        try:
+            data_inicio, data_fim = _ler_periodo()
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD.'}), 400
+        data_fim = data_fim or hoje
+        data_inicio = data_inicio or data_fim - timedelta(days=6)
+        if data_fim < data_inicio:
+            return jsonify({'erro': 'data_fim deve ser posterior a data_inicio.'}), 400
+        if (data_fim - data_inicio).days >= PERIODO_MAXIMO_DIAS:
+            return jsonify({'erro': f'O período deve ter no máximo {PERIODO_MAXIMO_DIAS} dias.'}), 400
+
+        query = Espaco.query.filter_by(id_inst=inst_id)
+        ids = request.args.get('espacos')
+        if ids:
+            try:
+                ids = [int(i) for i in ids.split(',') if i.strip()]
+            except ValueError:
+                return jsonify({'erro': 'espacos deve ser uma lista de ids separados por vírgula.'}), 400
+            query = query.filter(Espaco.id.in_(ids))
+        espacos = query.order_by(Espaco.id).all()
+
+        # Dias já agregados vêm do índice; os que faltam saem de uma única consulta agrupada
+        datas = datas_do_periodo(data_inicio, data_fim)
+        dias = analitica.periodo([e.id for e in espacos], datas, carregar_agregados) if espacos else {}
+
+        usuarios = Counter()
+        for dia in dias.values():
+            usuarios.update(dia.por_usuario)
+        top = usuarios.most_common(TOP_USUARIOS)
+        nomes = dict(db.session.query(User.id, User.nome).filter(User.id.in_([u for u, _ in top])).all()) if top else {}
+
+        return jsonify({
+            'inst_id': inst_id,
+            'data_inicio': data_inicio.isoformat(),
+            'data_fim': data_fim.isoformat(),
+            'espacos': [relatorio_espaco(espaco, datas, dias) for espaco in espacos],
+            'top_usuarios': [{'id': u, 'nome': nomes.get(u), 'reservas': n} for u, n in top]
+        }), 200
+
     return app
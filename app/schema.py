@@ -0,0 +1,121 @@
+import hashlib
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.exc import DatabaseError
+from app import db
+from app.ocupacao import minuto_do_dia
+
+MODOS_SCHEMA = ('versao', 'criar')
+# índices trocados por outros nos modelos: removidos dos bancos que ainda os têm
+INDICES_SUBSTITUIDOS = {
+    'reservas': ('ix_reservas_espaco_data_inicio',),
+    'reservas_arquivo': ('ix_reservas_arquivo_espaco_data',),
+}
+
+
+def versao_schema():
+    """Impressão digital dos modelos: tabelas, colunas (nome e tipo) e índices.
+
+    Muda sempre que um modelo ganha coluna, índice ou tabela, sem número de
+    versão para manter à mão.
+    """
+    partes = []
+    for tabela in db.metadata.sorted_tables:
+        partes.append(tabela.name)
+        partes.extend(f'{coluna.name}:{coluna.type}' for coluna in tabela.columns)
+        partes.extend(sorted(f"{indice.name}:{','.join(c.name for c in indice.columns)}" for indice in tabela.indexes))
+    return hashlib.sha1('|'.join(partes).encode()).hexdigest()
+
+
+def _versao_gravada():
+    try:
+        with db.engine.connect() as conn:
+            return conn.execute(text('SELECT versao FROM schema_versao')).scalar()
+    except DatabaseError:
+        # banco novo ou anterior ao controle de versão
+        return None
+
+
+def preparar_schema(modo='versao'):
+    """Cria/atualiza as tabelas na subida do app; retorna True se o schema foi aplicado.
+
+    Em 'versao', uma consulta compara a versão gravada em schema_versao com a
+    dos modelos e só roda create_all/atualizar_schema (que refletem o banco
+    tabela a tabela) quando elas diferem. Em 'criar', roda sempre.
+    """
+    versao = versao_schema()
+    if modo == 'versao' and _versao_gravada() == versao:
+        return False
+    # cria tabelas automaticamente (SQLite local se não tiver DATABASE_URL)
+    db.create_all()
+    # colunas/índices novos em bancos que já existiam
+    atualizar_schema()
+    preencher_identidades()
+    preencher_dias_e_minutos()
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE TABLE IF NOT EXISTS schema_versao (versao VARCHAR(40) NOT NULL)'))
+        conn.execute(text('DELETE FROM schema_versao'))
+        conn.execute(text('INSERT INTO schema_versao (versao) VALUES (:versao)'), {'versao': versao})
+    return True
+
+
+def atualizar_schema():
+    """Aplica colunas e índices novos em bancos criados por versões anteriores.
+
+    db.create_all() só cria as tabelas que ainda não existem. Colunas novas são
+    adicionadas como anuláveis (o default fica no modelo), índices são criados
+    se ainda não existirem e os de INDICES_SUBSTITUIDOS são removidos.
+    """
+    engine = db.engine
+    inspetor = inspect(engine)
+    with engine.begin() as conn:
+        for tabela in db.metadata.sorted_tables:
+            if not inspetor.has_table(tabela.name):
+                continue
+            colunas = {c['name'] for c in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name not in colunas:
+                    tipo = coluna.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'))
+            indices = {i['name'] for i in inspetor.get_indexes(tabela.name)}
+            for indice in tabela.indexes:
+                if indice.name not in indices:
+                    indice.create(conn)
+            for nome in INDICES_SUBSTITUIDOS.get(tabela.name, ()):
+                if nome in indices:
+                    conn.execute(text(f'DROP INDEX {nome}'))
+
+
+def preencher_dias_e_minutos(tamanho_lote=5000):
+    """Calcula dia_reserva/minuto_inicio/minuto_fim das reservas gravadas antes dessas colunas existirem."""
+    from app.models import Reserva, ReservaArquivo
+    for tabela in (Reserva.__table__, ReservaArquivo.__table__):
+        atualizar = update(tabela).where(tabela.c.id == bindparam('b_id')).values(
+            dia_reserva=bindparam('b_dia'), minuto_inicio=bindparam('b_inicio'), minuto_fim=bindparam('b_fim')
+        )
+        while True:
+            with db.engine.begin() as conn:
+                linhas = conn.execute(
+                    select(tabela.c.id, tabela.c.data_reserva, tabela.c.hora_inicio, tabela.c.hora_fim)
+                    .where(tabela.c.dia_reserva.is_(None)).limit(tamanho_lote)
+                ).all()
+                if not linhas:
+                    break
+                conn.execute(atualizar, [
+                    {'b_id': id_reserva, 'b_dia': data.toordinal(), 'b_inicio': minuto_do_dia(inicio), 'b_fim': minuto_do_dia(fim)}
+                    for id_reserva, data, inicio, fim in linhas
+                ])
+
+
+def preencher_identidades():
+    """Copia email/CPF de users e admins para identidades quando a tabela acaba de ser criada."""
+    with db.engine.begin() as conn:
+        if conn.execute(text('SELECT 1 FROM identidades LIMIT 1')).first():
+            return
+        for tipo, tabela in (('user', 'users'), ('admin', 'admins')):
+            # contas antigas com email/CPF repetidos entre as tabelas ficam de fora
+            conn.execute(text(
+                f"INSERT INTO identidades (tipo, conta_id, email, cpf) "
+                f"SELECT '{tipo}', id, email, cpf FROM {tabela} t "
+                f"WHERE NOT EXISTS (SELECT 1 FROM identidades i WHERE i.email = t.email OR i.cpf = t.cpf)"
+            ))
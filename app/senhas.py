@@ -0,0 +1,103 @@
+from collections import deque
+from threading import BoundedSemaphore, Lock
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+
+class FilaSenhasCheia(Exception):
+    """Há mais pedidos de hash em andamento do que a fila comporta."""
+
+
+def prefixo_do_metodo(metodo):
+    """Prefixo que o Werkzeug grava antes do '$' para `metodo`, com os padrões resolvidos.
+
+    Ex.: 'pbkdf2:sha256' -> 'pbkdf2:sha256:1000000'; levanta ValueError para métodos desconhecidos.
+    """
+    nome, *argumentos = metodo.split(':')
+    if nome == 'pbkdf2' and len(argumentos) <= 2:
+        algoritmo = argumentos[0] if argumentos else 'sha256'
+        iteracoes = int(argumentos[1]) if len(argumentos) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{algoritmo}:{iteracoes}'
+    if nome == 'scrypt' and len(argumentos) in (0, 3):
+        n, r, p = map(int, argumentos) if argumentos else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    raise ValueError(f'SENHA_METODO inválido: {metodo!r}.')
+
+
+class ServicoSenhas:
+    """Hash e verificação de senhas num pool de processos limitado.
+
+    O pbkdf2 segura a CPU (e o GIL) por centenas de milissegundos; rodando fora
+    das threads de requisição, um pico de logins não trava os workers. No máximo
+    `workers` hashes rodam ao mesmo tempo e `fila_maxima` esperam; além disso
+    as chamadas levantam FilaSenhasCheia (a rota responde 429). Com workers=0 o
+    hash roda na própria thread, sem pool.
+    """
+
+    def __init__(self, metodo='pbkdf2:sha256', workers=2, fila_maxima=32):
+        self.metodo = metodo
+        self.workers = workers
+        self._vagas = BoundedSemaphore(workers + fila_maxima) if workers else None
+        self._pool = None
+        self._lock = Lock()
+        self._prefixo = prefixo_do_metodo(metodo)
+
+    def _obter_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # multiprocessing só é importado quando o primeiro hash vai para o pool
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # fork a partir de um servidor com várias threads pode copiar locks presos;
+                # o forkserver cria os processos a partir de um processo limpo que só
+                # carrega o código do hash (sem o preload padrão de __main__, que
+                # rodaria main.py e um create_app() inteiro no processo auxiliar)
+                contexto = multiprocessing.get_context('forkserver')
+                contexto.set_forkserver_preload(['werkzeug.security'])
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=contexto)
+            return self._pool
+
+    def _executar(self, funcao, *args):
+        if not self.workers:
+            return funcao(*args)
+        if not self._vagas.acquire(blocking=False):
+            raise FilaSenhasCheia()
+        try:
+            return self._obter_pool().submit(funcao, *args).result()
+        finally:
+            self._vagas.release()
+
+    def gerar_hash(self, senha):
+        return self._executar(generate_password_hash, senha, self.metodo)
+
+    def gerar_hashes(self, lista):
+        """Gera vários hashes no pool (importação em lote) sem passar na frente dos pedidos.
+
+        No máximo `workers` hashes do lote ficam no pool de cada vez, cada um
+        ocupando uma vaga da mesma fila dos pedidos (esperando por ela em vez de
+        levantar FilaSenhasCheia): um login no meio da importação espera no
+        máximo uma rodada de hashes, não o lote inteiro.
+        """
+        if not self.workers:
+            return [generate_password_hash(senha, self.metodo) for senha in lista]
+        pool = self._obter_pool()
+        hashes, pendentes = [], deque()
+        for senha in lista:
+            if len(pendentes) >= self.workers:
+                hashes.append(pendentes.popleft().result())
+            self._vagas.acquire()
+            try:
+                futuro = pool.submit(generate_password_hash, senha, self.metodo)
+            except BaseException:
+                self._vagas.release()
+                raise
+            futuro.add_done_callback(lambda _: self._vagas.release())
+            pendentes.append(futuro)
+        hashes.extend(futuro.result() for futuro in pendentes)
+        return hashes
+
+    def verificar(self, senha_hash, senha):
+        return self._executar(check_password_hash, senha_hash, senha)
+
+    def precisa_rehash(self, senha_hash):
+        """Indica se o hash foi gerado com parâmetros diferentes dos configurados."""
+        return senha_hash.split('$', 1)[0] != self._prefixo
@@ -0,0 +1,90 @@
+import logging
+import os
+import sys
+
+from app import db
+from app.inicio import precompilar_templates
+
+logger = logging.getLogger(__name__)
+
+MODOS = ('dev', 'wsgi', 'asgi')
+# diretório de asgi.py
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _conferir_estado_por_processo(app):
+    """Com mais de um worker, caches e eventos em memória deixam de ser vistos pelos outros processos.
+
+    Avisa no log quando o atraso fica limitado (listas de catálogo até
+    CACHE_TTL, eventos só do próprio processo); recusa subir quando a
+    disponibilidade ficaria defasada sem limite (índices sem expiração).
+    """
+    if app.config['SERVIDOR_WORKERS'] <= 1:
+        return
+    if app.config['CACHE_BACKEND'] == 'memoria':
+        # horarios_disponiveis já expira em OCUPACAO_TTL; só as listas de espaços e instituições ficam até CACHE_TTL
+        logger.warning('CACHE_BACKEND=memoria com %d workers: listas de espaços e instituições podem ficar até '
+                       'CACHE_TTL segundos defasadas entre processos.',
+                       app.config['SERVIDOR_WORKERS'])
+    if app.config['EVENTOS_BACKEND'] == 'memoria':
+        logger.warning('EVENTOS_BACKEND=memoria com %d workers: os fluxos SSE só recebem eventos do próprio processo.',
+                       app.config['SERVIDOR_WORKERS'])
+    # índices sem expiração mostrariam para sempre como livres horários reservados em outro processo
+    for variavel in ('OCUPACAO_TTL', 'ANALITICA_TTL'):
+        if not app.config[variavel]:
+            raise ValueError(f"{variavel}=0 só é permitido com um único processo (SERVIDOR_WORKERS={app.config['SERVIDOR_WORKERS']}).")
+
+
+def _servir_wsgi(app):
+    """gunicorn com workers gthread; o app já criado (schema atualizado) é herdado pelos workers no fork."""
+    from gunicorn.app.base import BaseApplication  # dependência opcional, só para SERVIDOR=wsgi
+
+    def apos_fork(servidor, worker):
+        # conexões abertas pelo processo mestre não podem ser compartilhadas entre processos
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+    class ServidorWsgi(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{app.config['SERVIDOR_HOST']}:{app.config['SERVIDOR_PORTA']}")
+            self.cfg.set('workers', app.config['SERVIDOR_WORKERS'])
+            self.cfg.set('threads', app.config['SERVIDOR_THREADS'])
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('post_fork', apos_fork)
+            self.cfg.set('accesslog', '-')
+
+        def load(self):
+            return app
+
+    ServidorWsgi().run()
+
+
+def _servir_asgi(app):
+    """uvicorn sobre o adaptador de asgi.py; cada worker importa o módulo e monta o próprio app.
+
+    O processo atual é substituído pelo uvicorn (exec): os workers não nascem
+    de main.py, que os faria montar o app duas vezes.
+    """
+    import uvicorn  # noqa: F401 (dependência opcional, só para SERVIDOR=asgi: falha aqui, antes do exec)
+    os.execv(sys.executable, [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--app-dir', RAIZ,
+        '--host', app.config['SERVIDOR_HOST'], '--port', str(app.config['SERVIDOR_PORTA']),
+        '--workers', str(app.config['SERVIDOR_WORKERS']),
+    ])
+
+
+def executar(app):
+    """Sobe o servidor escolhido em SERVIDOR ('dev', 'wsgi' ou 'asgi')."""
+    modo = app.config['SERVIDOR']
+    if modo not in MODOS:
+        raise ValueError(f"SERVIDOR deve ser um de {', '.join(MODOS)}, não {modo!r}.")
+    if modo == 'dev':
+        app.run(debug=True, host=app.config['SERVIDOR_HOST'], port=app.config['SERVIDOR_PORTA'])
+        return
+    _conferir_estado_por_processo(app)
+    # compila os templates no processo mestre: herdados no fork (wsgi) ou lidos do cache de bytecode (asgi)
+    precompilar_templates(app)
+    if modo == 'wsgi':
+        _servir_wsgi(app)
+    else:
+        _servir_asgi(app)
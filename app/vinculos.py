@@ -0,0 +1,55 @@
+from importlib import import_module
+
+from sqlalchemy import exists, insert
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Instituicao, user_instituicoes, admin_instituicoes
+
+# tipo de conta -> (tabela de associação, coluna da conta)
+TABELAS_VINCULO = {
+    'user': (user_instituicoes, 'user_id'),
+    'admin': (admin_instituicoes, 'admin_id'),
+}
+
+
+def vinculado(tipo, conta_id, inst_id):
+    """Indica se a conta está vinculada à instituição.
+
+    Um EXISTS na chave primária (conta, instituição) da tabela de associação,
+    sem carregar a coleção instituicoes inteira.
+    """
+    tabela, coluna = TABELAS_VINCULO[tipo]
+    return db.session.query(exists().where(
+        tabela.c[coluna] == conta_id, tabela.c.instituicao_id == inst_id
+    )).scalar()
+
+
+def vincular(tipo, conta_id, inst_id):
+    """Insere o vínculo se ainda não existir; retorna True se inseriu. Não faz commit."""
+    tabela, coluna = TABELAS_VINCULO[tipo]
+    valores = {coluna: conta_id, 'instituicao_id': inst_id}
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto in ('sqlite', 'postgresql'):
+        # importado só aqui: o dialeto do PostgreSQL é pesado e só interessa quando é o banco em uso
+        insert_dialeto = import_module(f'sqlalchemy.dialects.{dialeto}').insert
+        resultado = db.session.execute(insert_dialeto(tabela).values(**valores).on_conflict_do_nothing())
+        return resultado.rowcount == 1
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(tabela).values(**valores))
+        return True
+    except IntegrityError:
+        return False
+
+
+def instituicoes_da_conta(tipo, conta_id):
+    """Instituições vinculadas à conta, no formato de Instituicao.to_dict, sem instanciar o ORM."""
+    tabela, coluna = TABELAS_VINCULO[tipo]
+    linhas = db.session.query(
+        Instituicao.id, Instituicao.nome, Instituicao.cnpj, Instituicao.email, Instituicao.token
+    ).join(tabela, tabela.c.instituicao_id == Instituicao.id).filter(tabela.c[coluna] == conta_id).all()
+    return [
+        {'id': id_inst, 'nome': nome, 'cnpj': cnpj, 'email': email, 'token': token}
+        for id_inst, nome, cnpj, email, token in linhas
+    ]
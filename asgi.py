@@ -0,0 +1,10 @@
+from a2wsgi import WSGIMiddleware
+
+from app import create_app
+
+# Ponto de entrada ASGI (SERVIDOR=asgi ou `uvicorn asgi:app --workers N`).
+# Cada worker importa este módulo e monta um único app (sem passar por main.py).
+# As rotas continuam síncronas: o adaptador roda cada pedido numa thread do
+# seu pool, com SERVIDOR_THREADS threads por worker.
+app_wsgi = create_app()
+app = WSGIMiddleware(app_wsgi, workers=app_wsgi.config['SERVIDOR_THREADS'])
@@ -0,0 +1,134 @@
+"""Carga mista de leituras e reservas no SQLite, antes e depois do perfil de produção.
+
+Para cada perfil (BANCO_PERFIL=padrao: journal de rollback e pool padrão do
+SQLAlchemy; BANCO_PERFIL=producao: WAL, synchronous=NORMAL, busy_timeout,
+mmap/cache e pool dimensionado) cria um banco novo, semeia os mesmos dados e
+roda threads que misturam GET /api/espacos, horarios_disponiveis e
+GET /api/reservas com POST /api/reservas. Mostra vazão, p50/p95 de leituras
+e de reservas e quantos pedidos falharam com 5xx ("database is locked").
+
+O cache de respostas fica desligado para que as leituras cheguem ao banco.
+
+Uso:
+    python -m benchmarks.bench_banco [--threads 16] [--segundos 10] [--escritas 0.2]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+PERFIS = ('padrao', 'producao')
+
+
+def preparar(perfil, n_espacos, n_reservas):
+    fd, caminho = tempfile.mkstemp(suffix=f'-{perfil}.db')
+    os.close(fd)
+    os.environ.update(DATABASE_URL=f'sqlite:///{caminho}', BANCO_PERFIL=perfil, CACHE_BACKEND='desligado',
+                      METRICAS_ATIVAS='0', LIMITES_ATIVOS='0')
+    from app import create_app, db
+    from app.models import Instituicao, Espaco, User, Reserva, gerar_slots
+    app = create_app()
+    random.seed(42)
+    with app.app_context():
+        inst = Instituicao(nome='Bench', cnpj=f'bench-{perfil}', email=f'bench-{perfil}@bench', token=f'bench-{perfil}')
+        db.session.add(inst)
+        db.session.flush()
+        espacos = [Espaco(id_inst=inst.id, nome=f'Sala {i}', tipo='sala', duracao_padrao=30, antecedencia_maxima_dias=60)
+                   for i in range(n_espacos)]
+        user = User(cpf='bench', nome='Bench', email='bench@bench', senha='x')
+        db.session.add_all(espacos + [user])
+        db.session.flush()
+        slots = gerar_slots(30)
+        hoje = date.today()
+        db.session.add_all(
+            Reserva(id_espaco=random.choice(espacos).id, id_user=user.id, data_reserva=hoje + timedelta(days=random.randrange(60)),
+                    hora_inicio=inicio, hora_fim=fim)
+            for inicio, fim in (random.choice(slots) for _ in range(n_reservas))
+        )
+        db.session.commit()
+        return app, inst.id, [e.id for e in espacos], [inicio.strftime('%H:%M') for inicio, _ in slots], caminho
+
+
+def rodar(app, inst_id, espacos, horas, threads, segundos, escritas):
+    hoje = date.today()
+    leituras, reservas = [], []
+    falhas = [0]
+    lock = threading.Lock()
+    fim = time.monotonic() + segundos
+
+    def trabalhador():
+        cliente = app.test_client()
+        minhas_leituras, minhas_reservas = [], []
+        while time.monotonic() < fim:
+            data = (hoje + timedelta(days=random.randrange(1, 60))).isoformat()
+            inicio = time.perf_counter()
+            if random.random() < escritas:
+                resposta = cliente.post('/api/reservas', json={
+                    'id_espaco': random.choice(espacos), 'user_email': 'bench@bench',
+                    'data_reserva': data, 'hora_inicio': random.choice(horas)
+                })
+                destino = minhas_reservas
+            else:
+                sorteio = random.random()
+                if sorteio < 0.3:
+                    resposta = cliente.get(f'/api/espacos?inst_id={inst_id}')
+                elif sorteio < 0.7:
+                    resposta = cliente.get(f'/api/espacos/{random.choice(espacos)}/horarios_disponiveis?data={data}')
+                else:
+                    resposta = cliente.get(f'/api/reservas?inst_id={inst_id}&limite=50&data_inicio={data}')
+                destino = minhas_leituras
+            if resposta.status_code >= 500:
+                with lock:
+                    falhas[0] += 1
+            else:
+                destino.append(time.perf_counter() - inicio)
+        with lock:
+            leituras.extend(minhas_leituras)
+            reservas.extend(minhas_reservas)
+
+    grupo = [threading.Thread(target=trabalhador) for _ in range(threads)]
+    for t in grupo:
+        t.start()
+    for t in grupo:
+        t.join()
+    return leituras, reservas, falhas[0]
+
+
+def percentis(amostras):
+    if not amostras:
+        return float('nan'), float('nan')
+    amostras = sorted(amostras)
+    return tuple(amostras[min(len(amostras) - 1, int(len(amostras) * p))] * 1000 for p in (0.5, 0.95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--escritas', type=float, default=0.2, help='fração dos pedidos que são reservas')
+    parser.add_argument('--espacos', type=int, default=20)
+    parser.add_argument('--reservas', type=int, default=5000, help='reservas semeadas antes da carga')
+    args = parser.parse_args()
+
+    print(f'{args.threads} threads, {args.segundos:.0f}s por perfil, {args.escritas:.0%} reservas')
+    print(f"{'perfil':<10}{'pedidos/s':>11}{'leitura p50/p95 ms':>22}{'reserva p50/p95 ms':>22}{'5xx':>6}")
+    for perfil in PERFIS:
+        app, inst_id, espacos, horas, caminho = preparar(perfil, args.espacos, args.reservas)
+        leituras, reservas, falhas = rodar(app, inst_id, espacos, horas, args.threads, args.segundos, args.escritas)
+        vazao = (len(leituras) + len(reservas)) / args.segundos
+        l50, l95 = percentis(leituras)
+        r50, r95 = percentis(reservas)
+        print(f'{perfil:<10}{vazao:>11.1f}{f"{l50:.1f} / {l95:.1f}":>22}{f"{r50:.1f} / {r95:.1f}":>22}{falhas:>6}')
+        with app.app_context():
+            from app import db
+            db.engine.dispose()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(caminho + sufixo):
+                os.remove(caminho + sufixo)
+
+
+if __name__ == '__main__':
+    main()
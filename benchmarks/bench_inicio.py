@@ -0,0 +1,77 @@
+"""Tempo de subida de um processo novo, antes e depois do modo de inicialização rápida.
+
+Cada medição roda num subprocesso limpo (como um worker recém-criado ou um
+app de teste) e separa três fases: importar o pacote `app`, create_app()
+(configuração, rotas e schema) e o primeiro GET de cada página HTML
+(compilação dos templates). Os cenários comparam SCHEMA_MODO=criar
+(create_all + reflexão do banco a cada subida) com SCHEMA_MODO=versao, e o
+Jinja sem e com cache de bytecode. O banco e o cache de templates são
+preparados antes, então só a subida "a quente" de um worker é medida.
+
+Uso:
+    python -m benchmarks.bench_inicio [--rodadas 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CENARIOS = (
+    ('antes (criar, sem cache)', {'SCHEMA_MODO': 'criar', 'TEMPLATES_CACHE': '0'}),
+    ('schema por versão', {'SCHEMA_MODO': 'versao', 'TEMPLATES_CACHE': '0'}),
+    ('versão + cache de templates', {'SCHEMA_MODO': 'versao', 'TEMPLATES_CACHE': '1'}),
+)
+
+MEDIR = """
+import json, time
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+app = create_app()
+criado = time.perf_counter()
+cliente = app.test_client()
+for pagina in ('/', '/home', '/admin'):
+    assert cliente.get(pagina).status_code == 200
+fim = time.perf_counter()
+print(json.dumps({'importar': importado - inicio, 'create_app': criado - importado, 'templates': fim - criado,
+                  'total': fim - inicio}))
+"""
+
+
+def medir(ambiente):
+    saida = subprocess.run([sys.executable, '-c', MEDIR], cwd=RAIZ, env=ambiente, capture_output=True, text=True,
+                           check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rodadas', type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        base = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(pasta, 'inicio.db')}", METRICAS_ATIVAS='0',
+                    TEMPLATES_CACHE_DIR=os.path.join(pasta, 'jinja'))
+        # cria o banco, grava a versão do schema e preenche o cache de templates
+        medir(dict(base, SCHEMA_MODO='versao', TEMPLATES_CACHE='1'))
+
+        # cenários intercalados a cada rodada, para que a variação da máquina afete todos igualmente
+        medidas = {nome: [] for nome, _ in CENARIOS}
+        for _ in range(args.rodadas):
+            for nome, variaveis in CENARIOS:
+                medidas[nome].append(medir(dict(base, **variaveis)))
+
+        print(f'{"cenário":<30} {"importar":>9} {"create_app":>11} {"templates":>10} {"total":>8}  (mediana, ms)')
+        for nome, _ in CENARIOS:
+            mediana = {fase: statistics.median(m[fase] for m in medidas[nome]) * 1000 for fase in medidas[nome][0]}
+            print(f"{nome:<30} {mediana['importar']:>9.1f} {mediana['create_app']:>11.1f} "
+                  f"{mediana['templates']:>10.1f} {mediana['total']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Clientes comuns sob a rajada de um cliente abusivo, sem e com o controle de admissão.
+
+Cada cliente comum (um IP por thread) consulta horarios_disponiveis e faz
+reservas num ritmo normal; as threads do abusivo saem todas do mesmo IP e
+disparam logins (pbkdf2) e exportações do histórico inteiro sem pausa. Para
+LIMITES_ATIVOS=0 e 1, mostra vazão e p50/p95 dos clientes comuns e quantos
+pedidos do abusivo foram atendidos ou recusados com 429.
+
+Uso:
+    python -m benchmarks.bench_limites [--comuns 8] [--abusivos 8] [--segundos 10]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+
+def preparar(limites, n_espacos, n_reservas, senha_metodo):
+    fd, caminho = tempfile.mkstemp(suffix=f'-limites{limites}.db')
+    os.close(fd)
+    os.environ.update(DATABASE_URL=f'sqlite:///{caminho}', LIMITES_ATIVOS=limites, CACHE_BACKEND='desligado',
+                      METRICAS_ATIVAS='0', SENHA_METODO=senha_metodo)
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import Instituicao, Espaco, User, Reserva, gerar_slots
+    app = create_app()
+    random.seed(7)
+    with app.app_context():
+        inst = Instituicao(nome='Bench', cnpj=f'limites-{limites}', email=f'limites-{limites}@bench')
+        db.session.add(inst)
+        db.session.flush()
+        espacos = [Espaco(id_inst=inst.id, nome=f'Sala {i}', tipo='sala', duracao_padrao=30, antecedencia_maxima_dias=60)
+                   for i in range(n_espacos)]
+        user = User(cpf='bench', nome='Bench', email='bench@bench', senha=generate_password_hash('senha', senha_metodo))
+        db.session.add_all(espacos + [user])
+        db.session.flush()
+        slots = gerar_slots(30)
+        hoje = date.today()
+        db.session.add_all(
+            Reserva(id_espaco=random.choice(espacos).id, id_user=user.id, data_reserva=hoje + timedelta(days=random.randrange(60)),
+                    hora_inicio=inicio, hora_fim=fim)
+            for inicio, fim in (random.choice(slots) for _ in range(n_reservas))
+        )
+        db.session.commit()
+        return app, inst.id, [e.id for e in espacos], [inicio.strftime('%H:%M') for inicio, _ in slots], caminho
+
+
+def rodar(app, inst_id, espacos, horas, comuns, abusivos, segundos):
+    hoje = date.today()
+    latencias, abuso = [], {'atendidos': 0, 'recusados': 0}
+    lock = threading.Lock()
+    fim = time.monotonic() + segundos
+
+    def comum(indice):
+        cliente = app.test_client()
+        ambiente = {'REMOTE_ADDR': f'10.0.0.{indice + 1}'}
+        minhas = []
+        while time.monotonic() < fim:
+            data = (hoje + timedelta(days=random.randrange(1, 60))).isoformat()
+            inicio = time.perf_counter()
+            if random.random() < 0.2:
+                resposta = cliente.post('/api/reservas', environ_base=ambiente, json={
+                    'id_espaco': random.choice(espacos), 'user_email': 'bench@bench',
+                    'data_reserva': data, 'hora_inicio': random.choice(horas)
+                })
+            else:
+                resposta = cliente.get(f'/api/espacos/{random.choice(espacos)}/horarios_disponiveis?data={data}',
+                                       environ_base=ambiente)
+            resposta.close()
+            minhas.append(time.perf_counter() - inicio)
+            time.sleep(0.05)  # ritmo de uma pessoa usando a página
+        with lock:
+            latencias.extend(minhas)
+
+    def abusivo():
+        cliente = app.test_client()
+        ambiente = {'REMOTE_ADDR': '10.66.66.66'}
+        atendidos = recusados = 0
+        while time.monotonic() < fim:
+            if random.random() < 0.5:
+                resposta = cliente.post('/api/login', environ_base=ambiente, json={'email': 'bench@bench', 'senha': 'senha'})
+            else:
+                resposta = cliente.get(f'/api/reservas/export?inst_id={inst_id}&formato=csv', environ_base=ambiente)
+                resposta.get_data()
+            # como um servidor WSGI faria: é no fechamento que a vaga de concorrência volta
+            resposta.close()
+            if resposta.status_code == 429:
+                recusados += 1
+            else:
+                atendidos += 1
+        with lock:
+            abuso['atendidos'] += atendidos
+            abuso['recusados'] += recusados
+
+    grupo = [threading.Thread(target=comum, args=(i,)) for i in range(comuns)]
+    grupo += [threading.Thread(target=abusivo) for _ in range(abusivos)]
+    for t in grupo:
+        t.start()
+    for t in grupo:
+        t.join()
+    return latencias, abuso
+
+
+def percentis(amostras):
+    if not amostras:
+        return float('nan'), float('nan')
+    amostras = sorted(amostras)
+    return tuple(amostras[min(len(amostras) - 1, int(len(amostras) * p))] * 1000 for p in (0.5, 0.95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comuns', type=int, default=8)
+    parser.add_argument('--abusivos', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--espacos', type=int, default=20)
+    parser.add_argument('--reservas', type=int, default=20000, help='reservas semeadas (tamanho da exportação)')
+    parser.add_argument('--senha-metodo', default='pbkdf2:sha256:100000')
+    args = parser.parse_args()
+
+    print(f'{args.comuns} clientes comuns, {args.abusivos} threads abusivas num IP, {args.segundos:.0f}s por cenário')
+    print(f"{'limites':<9}{'comuns req/s':>13}{'p50 / p95 ms':>18}{'abusivo: atendidos':>20}{'recusados':>11}")
+    for limites in ('0', '1'):
+        app, inst_id, espacos, horas, caminho = preparar(limites, args.espacos, args.reservas, args.senha_metodo)
+        latencias, abuso = rodar(app, inst_id, espacos, horas, args.comuns, args.abusivos, args.segundos)
+        p50, p95 = percentis(latencias)
+        print(f"{('ligado' if limites == '1' else 'desligado'):<9}{len(latencias) / args.segundos:>13.1f}"
+              f"{f'{p50:.1f} / {p95:.1f}':>18}{abuso['atendidos']:>20}{abuso['recusados']:>11}")
+        with app.app_context():
+            from app import db
+            db.engine.dispose()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(caminho + sufixo):
+                os.remove(caminho + sufixo)
+
+
+if __name__ == '__main__':
+    main()
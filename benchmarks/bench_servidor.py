@@ -0,0 +1,164 @@
+"""Vazão da API em cada modo de servidor (SERVIDOR=dev, wsgi, asgi).
+
+Sobe `python main.py` em cada modo sobre o mesmo banco semeado e dispara,
+com várias threads clientes em keep-alive, a mistura das rotas de leitura
+quentes (GET /api/espacos, horarios_disponiveis, GET /api/reservas) e,
+com --logins, uma fração de logins (pbkdf2). Mostra pedidos/s e latências
+p50/p95 por modo.
+
+O cache de respostas fica desligado por padrão para medir o trabalho das
+rotas, não o do cache (--cache memoria para medir com ele).
+
+Uso:
+    python -m benchmarks.bench_servidor [--modos dev,wsgi,asgi] [--clientes 32] [--segundos 10] [--workers 4] [--logins 0.02]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def semear(url, n_espacos=20, n_reservas=2000):
+    os.environ['DATABASE_URL'] = url
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import Instituicao, Espaco, User, Reserva, gerar_slots
+    app = create_app()
+    with app.app_context():
+        inst = Instituicao(nome='Bench', cnpj='bench', email='bench@bench', token='bench')
+        db.session.add(inst)
+        db.session.flush()
+        espacos = [Espaco(id_inst=inst.id, nome=f'Sala {i}', tipo='sala', duracao_padrao=60) for i in range(n_espacos)]
+        user = User(cpf='bench', nome='Bench', email='bench@bench', senha=generate_password_hash('senha'))
+        db.session.add_all(espacos + [user])
+        db.session.flush()
+        slots = gerar_slots(60)
+        hoje = date.today()
+        db.session.add_all(
+            Reserva(id_espaco=random.choice(espacos).id, id_user=user.id, data_reserva=hoje + timedelta(days=random.randrange(7)),
+                    hora_inicio=inicio, hora_fim=fim)
+            for inicio, fim in (random.choice(slots) for _ in range(n_reservas))
+        )
+        db.session.commit()
+        return inst.id, [e.id for e in espacos]
+
+
+def esperar_porta(porta, processo, limite=30):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError(f'servidor encerrou com código {processo.returncode}')
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=1)
+            conexao.request('GET', '/api/instituicoes')
+            conexao.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('servidor não respondeu a tempo')
+
+
+def pedidos(inst_id, espacos, logins):
+    hoje = date.today()
+    while True:
+        if random.random() < logins:
+            yield 'POST', '/api/login', json.dumps({'email': 'bench@bench', 'senha': 'senha'})
+            continue
+        sorteio = random.random()
+        if sorteio < 0.3:
+            yield 'GET', f'/api/espacos?inst_id={inst_id}', None
+        elif sorteio < 0.75:
+            data = (hoje + timedelta(days=random.randrange(7))).isoformat()
+            yield 'GET', f'/api/espacos/{random.choice(espacos)}/horarios_disponiveis?data={data}', None
+        else:
+            yield 'GET', f'/api/reservas?inst_id={inst_id}&limite=100', None
+
+
+def carga(porta, inst_id, espacos, clientes, segundos, logins=0.0):
+    latencias = []
+    erros = [0]
+    lock = threading.Lock()
+    fim = time.monotonic() + segundos
+
+    def cliente():
+        conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+        locais = []
+        for metodo, caminho, corpo in pedidos(inst_id, espacos, logins):
+            if time.monotonic() >= fim:
+                break
+            inicio = time.perf_counter()
+            try:
+                conexao.request(metodo, caminho, body=corpo, headers={'Content-Type': 'application/json'})
+                resposta = conexao.getresponse()
+                resposta.read()
+                if resposta.status >= 500:
+                    raise OSError(resposta.status)
+                locais.append(time.perf_counter() - inicio)
+            except (OSError, http.client.HTTPException):
+                conexao.close()
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+                with lock:
+                    erros[0] += 1
+        with lock:
+            latencias.extend(locais)
+
+    threads = [threading.Thread(target=cliente) for _ in range(clientes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencias.sort()
+
+    def percentil(p):
+        return latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else float('nan')
+    return len(latencias) / segundos, percentil(0.5), percentil(0.95), erros[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modos', default='dev,wsgi,asgi')
+    parser.add_argument('--clientes', type=int, default=32)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--cache', default='desligado')
+    parser.add_argument('--logins', type=float, default=0.0, help='fração dos pedidos que são logins')
+    parser.add_argument('--porta', type=int, default=5099)
+    args = parser.parse_args()
+
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        fd, caminho = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = f'sqlite:///{caminho}'
+    inst_id, espacos = semear(url)
+
+    print(f'{args.clientes} clientes, {args.segundos:.0f}s por modo, workers={args.workers}, threads={args.threads}, cache={args.cache}, logins={args.logins}')
+    print(f"{'modo':<6}{'pedidos/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'erros':>8}")
+    for modo in args.modos.split(','):
+        ambiente = dict(os.environ, DATABASE_URL=url, SERVIDOR=modo, SERVIDOR_PORTA=str(args.porta),
+                        SERVIDOR_WORKERS=str(args.workers), SERVIDOR_THREADS=str(args.threads),
+                        CACHE_BACKEND=args.cache, OCUPACAO_TTL='5', LIMITES_ATIVOS='0')
+        processo = subprocess.Popen([sys.executable, 'main.py'], cwd=RAIZ, env=ambiente, start_new_session=True,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            esperar_porta(args.porta, processo)
+            vazao, p50, p95, erros = carga(args.porta, inst_id, espacos, args.clientes, args.segundos, args.logins)
+            print(f'{modo:<6}{vazao:>12.1f}{p50:>10.1f}{p95:>10.1f}{erros:>8}')
+        finally:
+            os.killpg(processo.pid, signal.SIGTERM)
+            processo.wait()
+
+
+if __name__ == '__main__':
+    main()
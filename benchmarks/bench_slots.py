@@ -0,0 +1,43 @@
+"""Micro-benchmark da geração de slots de horarios_disponiveis.
+
+Compara a geração original (datetime.combine/timedelta + strftime por slot a
+cada pedido) com os modelos memorizados de app.models.
+
+Uso: python -m benchmarks.bench_slots
+"""
+import timeit
+from datetime import datetime, timedelta, time
+
+from app.models import modelo_slots
+
+
+def gerar_slots_original(duracao=30):
+    inicio = time(8, 0)
+    fim = time(22, 0)
+    atual = datetime.combine(datetime.today(), inicio)
+    horarios = []
+    while atual.time() < fim:
+        proximo = (atual + timedelta(minutes=duracao)).time()
+        horarios.append((atual.time(), proximo))
+        atual += timedelta(minutes=duracao)
+    return horarios
+
+
+def antes(duracao):
+    return [{'inicio': i.strftime('%H:%M'), 'fim': f.strftime('%H:%M')} for i, f in gerar_slots_original(duracao)]
+
+
+def depois(duracao):
+    return [{'inicio': i, 'fim': f} for i, f in modelo_slots(duracao).rotulos]
+
+
+def main(repeticoes=2000):
+    for duracao in (15, 30, 60):
+        assert antes(duracao) == depois(duracao)
+        t_antes = timeit.timeit(lambda: antes(duracao), number=repeticoes) / repeticoes
+        t_depois = timeit.timeit(lambda: depois(duracao), number=repeticoes) / repeticoes
+        print(f'duracao={duracao:>3}min  antes={t_antes * 1e6:8.1f}us  depois={t_depois * 1e6:8.1f}us  ({t_antes / t_depois:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
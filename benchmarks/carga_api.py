@@ -0,0 +1,329 @@
+"""Teste de carga da API de reservas com dados sintéticos.
+
+Semeia N instituições, M espaços por instituição, K usuários e R reservas
+pelos modelos de app.models e dispara uma mistura de pedidos (login,
+listagem de espaços, disponibilidade, reserva, histórico) com várias
+threads, pelo test client do Flask (padrão) ou contra um servidor local
+(--url). Mostra, por rota, p50/p95/p99, vazão e consultas SQL por pedido.
+
+Com --verificar, compara as consultas por pedido com os tetos de um JSON
+({"rota": max}) e sai com código 1 se alguma rota passar do teto, para que
+regressões em routes.py (N+1, consultas a mais) quebrem o CI. A latência
+varia entre máquinas e só é reportada.
+
+Uso:
+    python -m benchmarks.carga_api [--instituicoes 5] [--espacos 10] [--usuarios 500] [--reservas 20000]
+                                   [--threads 8] [--pedidos 4000] [--json resultado.json]
+                                   [--verificar benchmarks/limites_consultas.json]
+
+Contra um servidor: semeie o banco, suba o servidor sobre ele e rode com --url
+(os dados já semeados são reaproveitados):
+    DATABASE_URL=sqlite:////tmp/carga.db python -m benchmarks.carga_api --so-semear
+    DATABASE_URL=sqlite:////tmp/carga.db SENHA_METODO=pbkdf2:sha256:1000 SERVIDOR=wsgi python main.py
+    DATABASE_URL=sqlite:////tmp/carga.db python -m benchmarks.carga_api --url http://127.0.0.1:5000
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+SENHA = 'senha-carga'
+# rota -> peso na mistura
+MISTURA = {
+    'login': 5,
+    'listar_espacos': 20,
+    'horarios_disponiveis': 30,
+    'disponibilidade': 10,
+    'reservar': 15,
+    'historico': 15,
+    'historico_pagina': 5,
+}
+
+
+# --- Dados ---
+def semear(app, n_instituicoes, n_espacos, n_usuarios, n_reservas, semente=42):
+    """Grava o conjunto sintético com INSERTs em lote; retorna o que a mistura precisa sortear."""
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import Instituicao, Espaco, User, Reserva, IdentidadeConta, user_instituicoes, modelo_slots, \
+        HORA_ABERTURA, HORA_FECHAMENTO
+
+    aleatorio = random.Random(semente)
+    # um hash só para todos: o custo do pbkdf2 entra nos logins, não na semeadura
+    senha_hash = generate_password_hash(SENHA, app.config['SENHA_METODO'])
+    hoje = date.today()
+    with app.app_context():
+        insts = db.session.scalars(insert(Instituicao).returning(Instituicao.id, sort_by_parameter_order=True), [
+            {'nome': f'Instituição {i}', 'cnpj': f'carga-{i}', 'email': f'inst{i}@carga', 'token': f'carga-{i}'}
+            for i in range(n_instituicoes)
+        ]).all()
+        linhas_espacos = [
+            {'id_inst': inst_id, 'nome': f'Espaço {inst_id}-{j}', 'tipo': 'sala', 'descricao': '',
+             'duracao_padrao': aleatorio.choice((30, 60)), 'antecedencia_maxima_dias': 30,
+             'multi_reservas': j == 0, 'disponibilidade': True,
+             'hora_abertura': HORA_ABERTURA, 'hora_fechamento': HORA_FECHAMENTO}
+            for inst_id in insts for j in range(n_espacos)
+        ]
+        ids_espacos = db.session.scalars(insert(Espaco).returning(Espaco.id, sort_by_parameter_order=True), linhas_espacos).all()
+        usuarios = [{'cpf': f'carga-{k}', 'nome': f'Usuário {k}', 'email': f'u{k}@carga', 'senha': senha_hash,
+                     'active_inst_id': insts[k % len(insts)]} for k in range(n_usuarios)]
+        ids_usuarios = db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), usuarios).all()
+        db.session.execute(insert(IdentidadeConta), [
+            {'tipo': 'user', 'conta_id': user_id, 'email': u['email'], 'cpf': u['cpf']} for user_id, u in zip(ids_usuarios, usuarios)
+        ])
+        db.session.execute(user_instituicoes.insert(), [
+            {'user_id': user_id, 'instituicao_id': u['active_inst_id']} for user_id, u in zip(ids_usuarios, usuarios)
+        ])
+
+        ocupados = set()
+        reservas = []
+        while len(reservas) < n_reservas:
+            indice = aleatorio.randrange(len(ids_espacos))
+            espaco = linhas_espacos[indice]
+            inicio, fim = aleatorio.choice(modelo_slots(espaco['duracao_padrao'], HORA_ABERTURA, HORA_FECHAMENTO).slots)
+            dia = hoje + timedelta(days=aleatorio.randrange(-90, 30))
+            chave = (indice, dia, inicio)
+            if chave in ocupados and not espaco['multi_reservas']:
+                continue
+            ocupados.add(chave)
+            reservas.append({'id_espaco': ids_espacos[indice], 'id_user': aleatorio.choice(ids_usuarios),
+                             'data_reserva': dia, 'hora_inicio': inicio, 'hora_fim': fim, 'observacoes': ''})
+        for i in range(0, len(reservas), 5000):
+            db.session.execute(insert(Reserva), reservas[i:i + 5000])
+        db.session.commit()
+
+    return carregar(app)
+
+
+def carregar(app):
+    """Lê de volta o conjunto já semeado (instituições com cnpj 'carga-*'); None se não houver."""
+    from app import db
+    from app.models import Instituicao, Espaco, User
+    with app.app_context():
+        insts = db.session.scalars(db.select(Instituicao.id).where(Instituicao.cnpj.like('carga-%'))).all()
+        if not insts:
+            return None
+        espacos = db.session.execute(
+            db.select(Espaco.id_inst, Espaco.id, Espaco.duracao_padrao).where(Espaco.id_inst.in_(insts))
+        ).all()
+        usuarios = db.session.scalars(db.select(User.email).where(User.cpf.like('carga-%'))).all()
+    espacos_por_inst = defaultdict(list)
+    for inst_id, espaco_id, duracao in espacos:
+        espacos_por_inst[inst_id].append((espaco_id, duracao))
+    return {'instituicoes': list(espacos_por_inst), 'espacos': dict(espacos_por_inst), 'usuarios': usuarios}
+
+
+# --- Mistura de pedidos ---
+def sortear_pedido(dados, aleatorio):
+    """(rota, método, caminho, corpo JSON) de um pedido sorteado conforme MISTURA."""
+    from app.models import modelo_slots, HORA_ABERTURA, HORA_FECHAMENTO
+    rota = aleatorio.choices(list(MISTURA), weights=list(MISTURA.values()))[0]
+    inst_id = aleatorio.choice(dados['instituicoes'])
+    espaco_id, duracao = aleatorio.choice(dados['espacos'][inst_id])
+    dia = (date.today() + timedelta(days=aleatorio.randrange(0, 30))).isoformat()
+    if rota == 'login':
+        return rota, 'POST', '/api/login', {'email': aleatorio.choice(dados['usuarios']), 'senha': SENHA}
+    if rota == 'listar_espacos':
+        return rota, 'GET', f'/api/espacos?inst_id={inst_id}', None
+    if rota == 'horarios_disponiveis':
+        return rota, 'GET', f'/api/espacos/{espaco_id}/horarios_disponiveis?data={dia}', None
+    if rota == 'disponibilidade':
+        fim = (date.fromisoformat(dia) + timedelta(days=6)).isoformat()
+        return rota, 'GET', f'/api/disponibilidade?inst_id={inst_id}&data_inicio={dia}&data_fim={fim}', None
+    if rota == 'reservar':
+        inicio, _ = aleatorio.choice(modelo_slots(duracao, HORA_ABERTURA, HORA_FECHAMENTO).rotulos)
+        return rota, 'POST', '/api/reservas', {'id_espaco': espaco_id, 'user_email': aleatorio.choice(dados['usuarios']),
+                                               'data_reserva': dia, 'hora_inicio': inicio}
+    if rota == 'historico':
+        return rota, 'GET', f'/api/reservas?inst_id={inst_id}&limite=100', None
+    return rota, 'GET', f'/api/reservas?inst_id={inst_id}&limite=100&apos_id={aleatorio.randrange(1, 1000)}', None
+
+
+# --- Execução ---
+class ContadorConsultas:
+    """Conta as consultas SQL de cada pedido feito pelo test client (por thread)."""
+
+    def __init__(self, app):
+        from sqlalchemy import event
+        from app import db
+        self._local = threading.local()
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args):
+        self._local.total = getattr(self._local, 'total', 0) + 1
+
+    def zerar(self):
+        self._local.total = 0
+
+    def total(self):
+        return getattr(self._local, 'total', 0)
+
+
+def executor_local(app):
+    contador = ContadorConsultas(app)
+    clientes = threading.local()
+
+    def executar(metodo, caminho, corpo):
+        if not hasattr(clientes, 'cliente'):
+            clientes.cliente = app.test_client()
+        contador.zerar()
+        resposta = clientes.cliente.open(caminho, method=metodo, json=corpo)
+        return resposta.status_code, contador.total()
+    return executar
+
+
+def executor_http(url):
+    partes = urlsplit(url)
+    conexoes = threading.local()
+
+    def executar(metodo, caminho, corpo):
+        if not hasattr(conexoes, 'conexao'):
+            conexoes.conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=60)
+        try:
+            conexoes.conexao.request(metodo, caminho, body=json.dumps(corpo) if corpo else None,
+                                     headers={'Content-Type': 'application/json'})
+            resposta = conexoes.conexao.getresponse()
+            resposta.read()
+            return resposta.status, None
+        except (OSError, http.client.HTTPException):
+            del conexoes.conexao
+            return 599, None
+    return executar
+
+
+def rodar(executar, dados, n_pedidos, threads, semente=7):
+    amostras = defaultdict(list)  # rota -> [(segundos, status, consultas)]
+    lock = threading.Lock()
+    sementes = random.Random(semente)
+    planos = [sortear_pedido(dados, random.Random(sementes.random())) for _ in range(n_pedidos)]
+
+    def um(plano):
+        rota, metodo, caminho, corpo = plano
+        inicio = time.perf_counter()
+        status, consultas = executar(metodo, caminho, corpo)
+        duracao = time.perf_counter() - inicio
+        with lock:
+            amostras[rota].append((duracao, status, consultas))
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(um, planos))
+    return amostras, time.perf_counter() - inicio
+
+
+def resumir(amostras, segundos):
+    def percentil(valores, p):
+        return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+    resumo = {}
+    for rota in MISTURA:
+        linhas = amostras.get(rota)
+        if not linhas:
+            continue
+        tempos = sorted(d for d, _, _ in linhas)
+        consultas = [c for _, _, c in linhas if c is not None]
+        status = defaultdict(int)
+        for _, codigo, _ in linhas:
+            status[codigo] += 1
+        resumo[rota] = {
+            'pedidos': len(linhas),
+            'pedidos_por_segundo': round(len(linhas) / segundos, 1),
+            'p50_ms': round(percentil(tempos, 0.50), 2),
+            'p95_ms': round(percentil(tempos, 0.95), 2),
+            'p99_ms': round(percentil(tempos, 0.99), 2),
+            'consultas_por_pedido': round(sum(consultas) / len(consultas), 2) if consultas else None,
+            'consultas_max': max(consultas) if consultas else None,
+            'status': dict(sorted(status.items())),
+        }
+    return resumo
+
+
+def imprimir(resumo, total, segundos):
+    print(f"{'rota':<22}{'pedidos':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'consultas':>11}  status")
+    for rota, r in resumo.items():
+        consultas = '—' if r['consultas_por_pedido'] is None else f"{r['consultas_por_pedido']:.1f}"
+        status = ' '.join(f'{codigo}:{n}' for codigo, n in r['status'].items())
+        print(f"{rota:<22}{r['pedidos']:>8}{r['pedidos_por_segundo']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{consultas:>11}  {status}")
+    print(f'total: {total} pedidos em {segundos:.1f}s ({total / segundos:.1f} pedidos/s)')
+
+
+def verificar(resumo, caminho):
+    """Rotas cujo máximo de consultas por pedido passou do teto do arquivo."""
+    with open(caminho, encoding='utf-8') as arquivo:
+        tetos = json.load(arquivo)
+    return [
+        f"{rota}: {resumo[rota]['consultas_max']} consultas (teto {teto})"
+        for rota, teto in tetos.items()
+        if rota in resumo and resumo[rota]['consultas_max'] is not None and resumo[rota]['consultas_max'] > teto
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--instituicoes', type=int, default=5)
+    parser.add_argument('--espacos', type=int, default=10, help='espaços por instituição')
+    parser.add_argument('--usuarios', type=int, default=500)
+    parser.add_argument('--reservas', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--pedidos', type=int, default=4000)
+    parser.add_argument('--url', help='servidor a testar; sem isso usa o test client')
+    parser.add_argument('--so-semear', action='store_true', help='só grava os dados (para testar um servidor com --url)')
+    parser.add_argument('--senha-metodo', default='pbkdf2:sha256:1000',
+                        help='custo do hash nos logins; use o de produção para medir o pbkdf2 real')
+    parser.add_argument('--json', help='grava o resumo neste arquivo')
+    parser.add_argument('--verificar', help='JSON {rota: máximo de consultas por pedido}; sai com 1 se passar')
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        fd, caminho = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        os.environ['DATABASE_URL'] = f'sqlite:///{caminho}'
+        print(f'banco: {os.environ["DATABASE_URL"]}')
+    os.environ.setdefault('SENHA_METODO', args.senha_metodo)
+    # sem o log de consultas lentas no meio do relatório (GET /metrics não entra na mistura)
+    os.environ.setdefault('METRICAS_ATIVAS', '0')
+    # todos os pedidos saem do mesmo IP: sem o controle de admissão, que recusaria a carga
+    os.environ.setdefault('LIMITES_ATIVOS', '0')
+    from app import create_app
+    app = create_app()
+
+    dados = carregar(app)
+    if dados is None:
+        inicio = time.perf_counter()
+        dados = semear(app, args.instituicoes, args.espacos, args.usuarios, args.reservas)
+        print(f'semeados {args.instituicoes} instituições, {args.instituicoes * args.espacos} espaços, '
+              f'{args.usuarios} usuários e {args.reservas} reservas em {time.perf_counter() - inicio:.1f}s')
+    else:
+        print(f"usando os dados já semeados: {len(dados['instituicoes'])} instituições, {len(dados['usuarios'])} usuários")
+    if args.so_semear:
+        return
+
+    executar = executor_http(args.url) if args.url else executor_local(app)
+    amostras, segundos = rodar(executar, dados, args.pedidos, args.threads)
+    resumo = resumir(amostras, segundos)
+    imprimir(resumo, args.pedidos, segundos)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump({'segundos': round(segundos, 3), 'rotas': resumo}, arquivo, ensure_ascii=False, indent=2)
+    if args.verificar:
+        falhas = verificar(resumo, args.verificar)
+        for falha in falhas:
+            print(f'REGRESSÃO {falha}', file=sys.stderr)
+        if falhas:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
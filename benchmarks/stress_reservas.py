@@ -0,0 +1,96 @@
+"""Teste de estresse de reservas concorrentes em POST /api/reservas.
+
+Dispara várias reservas em paralelo para os mesmos slots e confere no banco
+que nenhum espaço com multi_reservas=False ficou com reservas sobrepostas.
+Sai com código 1 se encontrar dupla reserva.
+
+Uso:
+    python -m benchmarks.stress_reservas [--threads 16] [--tentativas 400]
+    DATABASE_URL=postgresql://... python -m benchmarks.stress_reservas
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+
+def preparar_app():
+    if not os.getenv('DATABASE_URL'):
+        fd, caminho = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        os.environ['DATABASE_URL'] = f'sqlite:///{caminho}'
+    # as threads disputam o mesmo slot a partir do mesmo IP: o controle de admissão fica de fora
+    os.environ.setdefault('LIMITES_ATIVOS', '0')
+    from app import create_app
+    return create_app()
+
+
+def semear(app, n_espacos, n_usuarios):
+    from app import db
+    from app.models import Instituicao, Espaco, User
+    with app.app_context():
+        inst = Instituicao(nome='Estresse', cnpj=f'stress-{random.random()}', email=f'{random.random()}@stress')
+        db.session.add(inst)
+        db.session.flush()
+        espacos = [Espaco(id_inst=inst.id, nome=f'Sala {i}', tipo='sala', duracao_padrao=60, multi_reservas=(i == 0)) for i in range(n_espacos)]
+        usuarios = [User(cpf=f'{inst.id}-{i}', nome=f'U{i}', email=f'u{i}.{inst.id}@stress', senha='x') for i in range(n_usuarios)]
+        db.session.add_all(espacos + usuarios)
+        db.session.commit()
+        return [(e.id, e.multi_reservas) for e in espacos], [u.email for u in usuarios]
+
+
+def sobreposicoes(app, ids_espacos):
+    from sqlalchemy.orm import aliased
+    from app import db
+    from app.models import Reserva
+    a, b = aliased(Reserva), aliased(Reserva)
+    with app.app_context():
+        return db.session.query(a.id, b.id).filter(
+            a.id_espaco.in_(ids_espacos),
+            a.id_espaco == b.id_espaco,
+            a.data_reserva == b.data_reserva,
+            a.id < b.id,
+            a.hora_inicio < b.hora_fim,
+            a.hora_fim > b.hora_inicio
+        ).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--tentativas', type=int, default=400)
+    parser.add_argument('--espacos', type=int, default=3)
+    args = parser.parse_args()
+
+    app = preparar_app()
+    espacos, emails = semear(app, args.espacos, args.threads)
+    dia = (date.today() + timedelta(days=1)).isoformat()
+    horas = ['08:00', '09:00', '10:00']
+
+    def reservar(i):
+        id_espaco, _ = random.choice(espacos)
+        resp = app.test_client().post('/api/reservas', json={
+            'id_espaco': id_espaco,
+            'user_email': emails[i % len(emails)],
+            'data_reserva': dia,
+            'hora_inicio': random.choice(horas),
+        })
+        return resp.status_code
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        status = list(pool.map(reservar, range(args.tentativas)))
+
+    exclusivos = [id_espaco for id_espaco, multi in espacos if not multi]
+    duplas = sobreposicoes(app, exclusivos)
+    resumo = {codigo: status.count(codigo) for codigo in sorted(set(status))}
+    print(f'{args.tentativas} tentativas em {args.threads} threads: {resumo}')
+    print(f'reservas sobrepostas em espaços exclusivos: {len(duplas)}')
+    if duplas or any(codigo >= 500 for codigo in status):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,10 @@
 from app import create_app
+from app.servidor import executar
 
-app = create_app()
+# os processos auxiliares do pool de senhas reexecutam este arquivo como __mp_main__;
+# ali só o código do hash é usado, então o app é montado apenas no processo principal
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, host="127.0.0.1")
\ No newline at end of file
+    executar(app)
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App sobre um SQLite novo, sem limites, métricas nem pool de senhas."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'teste.db'}")
+    for variavel, valor in (('LIMITES_ATIVOS', '0'), ('METRICAS_ATIVAS', '0'), ('SENHA_WORKERS', '0'),
+                            ('SENHA_METODO', 'pbkdf2:sha256:1000'), ('TEMPLATES_CACHE', '0')):
+        monkeypatch.setenv(variavel, valor)
+    from app import create_app, db
+    app = create_app()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def instituicao(app):
+    from app import db
+    from app.models import Instituicao
+    with app.app_context():
+        inst = Instituicao(nome='Escola', cnpj='00.000.000/0001-00', email='escola@teste')
+        db.session.add(inst)
+        db.session.commit()
+        return inst.id
@@ -0,0 +1,30 @@
+from app.models import Espaco
+
+
+def _importar(cliente, inst_id, linhas):
+    resposta = cliente.post(f'/api/instituicoes/{inst_id}/importar/espacos', json=linhas)
+    resposta.close()
+    return resposta
+
+
+def test_campo_inteiro_com_lista_vira_erro_da_linha(app, cliente, instituicao):
+    resposta = _importar(cliente, instituicao, [
+        {'nome': 'X', 'tipo': 't', 'duracao_padrao': [1]},
+        {'nome': 'Y', 'tipo': 't', 'antecedencia_maxima_dias': {'dias': 3}},
+        {'nome': 'Z', 'tipo': 't', 'duracao_padrao': 60},
+    ])
+
+    assert resposta.status_code == 200
+    relatorio = resposta.get_json()
+    assert relatorio['inseridos'] == 1
+    assert [erro['linha'] for erro in relatorio['erros']] == [1, 2]
+    assert 'duracao_padrao' in relatorio['erros'][0]['erro']
+    with app.app_context():
+        assert [e.nome for e in Espaco.query.filter_by(id_inst=instituicao)] == ['Z']
+
+
+def test_campo_inteiro_invalido_em_texto(cliente, instituicao):
+    resposta = _importar(cliente, instituicao, [{'nome': 'X', 'tipo': 't', 'duracao_padrao': 'meia hora'}])
+
+    assert resposta.status_code == 200
+    assert resposta.get_json()['erros'] == [{'linha': 1, 'erro': 'duracao_padrao deve ser um número inteiro.'}]
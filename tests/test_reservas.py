@@ -0,0 +1,45 @@
+from datetime import date, time, timedelta
+
+from app import db
+from app.arquivo import arquivar_reservas
+from app.models import Espaco, Reserva, ReservaArquivo, User
+
+
+def _espaco_com_reserva(app, inst_id, dia):
+    with app.app_context():
+        espaco = Espaco(id_inst=inst_id, nome='Sala 1', tipo='sala')
+        user = User(cpf='1', nome='Ana', email='ana@teste', senha='x')
+        db.session.add_all([espaco, user])
+        db.session.flush()
+        db.session.add_all([
+            Reserva(id_espaco=espaco.id, id_user=user.id, data_reserva=dia, hora_inicio=time(8), hora_fim=time(8, 30)),
+            # a reserva de maior id nunca é arquivada
+            Reserva(id_espaco=espaco.id, id_user=user.id, data_reserva=date.today() + timedelta(days=1),
+                    hora_inicio=time(8), hora_fim=time(8, 30)),
+        ])
+        db.session.commit()
+        return espaco.id
+
+
+def test_reserva_em_dia_arquivado_e_recusada(app, cliente, instituicao):
+    dia = date.today() - timedelta(days=40)
+    espaco_id = _espaco_com_reserva(app, instituicao, dia)
+    with app.app_context():
+        assert arquivar_reservas(date.today() - timedelta(days=30))['movidas'] == 1
+
+    resposta = cliente.post('/api/reservas', json={'id_espaco': espaco_id, 'user_email': 'ana@teste',
+                                                   'data_reserva': dia.isoformat(), 'hora_inicio': '08:00'})
+
+    assert resposta.status_code == 400
+    with app.app_context():
+        filtro = {'id_espaco': espaco_id, 'dia_reserva': dia.toordinal()}
+        assert Reserva.query.filter_by(**filtro).count() + ReservaArquivo.query.filter_by(**filtro).count() == 1
+
+
+def test_reserva_hoje_continua_aceita(app, cliente, instituicao):
+    espaco_id = _espaco_com_reserva(app, instituicao, date.today() - timedelta(days=40))
+
+    resposta = cliente.post('/api/reservas', json={'id_espaco': espaco_id, 'user_email': 'ana@teste',
+                                                   'data_reserva': date.today().isoformat(), 'hora_inicio': '21:30'})
+
+    assert resposta.status_code == 201